@@ -0,0 +1,103 @@
+# JWT verification with a bounded cache of already-verified tokens.
+# Decoding a token checks its signature and claims on every call; since the
+# frontend verifies the token on every page mount, verified tokens are cached
+# by SHA-256 digest together with their claims until their "exp" claim.
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Annotated
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+import metrics
+
+# Define the OAuth2 bearer scheme for token authentication
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+# Constants for JWT token creation
+SECRET_KEY = os.getenv("SECRET_KEY", "mateo")
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# Bounded LRU mapping token digests to their verified claims
+class TokenCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    # Return the cached claims for a token, or None if absent or expired
+    def get(self, token: str):
+        key = self.digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, claims = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    # Cache verified claims until the token's expiry, evicting the least recently used
+    def put(self, token: str, claims: dict):
+        expires_at = claims.get("exp")
+        if not isinstance(expires_at, (int, float)) or self.maxsize <= 0:
+            return
+        key = self.digest(token)
+        self._entries[key] = (expires_at, claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+# Decode and validate a token without the cache. python-jose (and the crypto
+# backends it pulls in) is imported on first use rather than at worker start-up.
+def decode_token(token: str) -> dict:
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=403, detail="Token is invalid or expired")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=403, detail="Token is invalid or expired")
+    return payload
+
+# Function to verify a token, returning its claims
+def verify_token(token: str) -> dict:
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = decode_token(token)
+        token_cache.put(token, claims)
+    return claims
+
+# Dependency for protected routes: the verified claims of the bearer token
+async def get_token_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    return verify_token(token)
+
+claims_dependency = Annotated[dict, Depends(get_token_claims)]
+
+@metrics.register
+def collect_token_cache_metrics():
+    return {
+        "token_cache_entries": len(token_cache),
+        "token_cache_hits_total": token_cache.hits,
+        "token_cache_misses_total": token_cache.misses,
+    }
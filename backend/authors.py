@@ -0,0 +1,107 @@
+# Background backfill of post and story authors.
+# Posts and stories reference their author through the user_id foreign key, and
+# responses show the author's current name. Rows written before stories had a
+# user_id, or whose user_id pointed at a user that no longer existed, only carry
+# the name they were posted with; this links them to the user of that name.
+# Rows are converted in chunks of AUTHOR_BACKFILL_BATCH_SIZE, each chunk in its
+# own short transaction, with a pause in between so the backfill never holds
+# long locks or starves request handlers. Rows without a matching user keep no
+# author and are skipped by walking forward through the primary key.
+import asyncio
+import logging
+import os
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import metrics
+import models
+from cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+AUTHOR_BACKFILL_ENABLED = os.getenv('AUTHOR_BACKFILL_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+AUTHOR_BACKFILL_BATCH_SIZE = int(os.getenv('AUTHOR_BACKFILL_BATCH_SIZE', '500'))
+AUTHOR_BACKFILL_PAUSE_SECONDS = float(os.getenv('AUTHOR_BACKFILL_PAUSE_SECONDS', '0.1'))
+
+# Link the next chunk of author-less rows after after_id to the user with the
+# same name. Returns the last id examined (None once no rows are left) and the
+# number of rows linked.
+async def backfill_batch(db: AsyncSession, model, kind: str, after_id: int, batch_size: int) -> tuple[int | None, int]:
+    result = await db.execute(
+        select(model.id)
+        .where(model.user_id.is_(None), model.username.is_not(None), model.id > after_id)
+        .order_by(model.id)
+        .limit(batch_size)
+    )
+    ids = result.scalars().all()
+    if not ids:
+        return None, 0
+    author = select(models.User.id).where(models.User.username == model.username)
+    result = await db.execute(
+        update(model)
+        .where(model.id.in_(ids), author.exists())
+        .values(user_id=author.scalar_subquery(), revision=model.revision + 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if result.rowcount:
+        response_cache.invalidate(*(f"{kind}:{row_id}" for row_id in ids))
+    return ids[-1], result.rowcount
+
+# Walks posts and then stories once, linking their authors chunk by chunk
+class AuthorBackfill:
+    def __init__(self, session_factory, batch_size: int, pause: float):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.pause = pause
+        self._task = None
+        self.linked = 0
+        self.done = False
+
+    async def run(self):
+        for model, kind in ((models.Post, "post"), (models.Story, "story")):
+            after_id = 0
+            while after_id is not None:
+                async with self.session_factory() as db:
+                    after_id, linked = await backfill_batch(db, model, kind, after_id, self.batch_size)
+                self.linked += linked
+                await asyncio.sleep(self.pause)
+        self.done = True
+
+    async def _run(self):
+        try:
+            await self.run()
+        except Exception:
+            # Linking is idempotent; the next start resumes with the rows still left
+            logger.exception("Backfilling post and story authors failed")
+
+    # Start the backfill, called on application startup
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # Stop the backfill, called on application shutdown
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+backfill = None
+
+# Create the process-wide backfill bound to the primary session factory
+def init_backfill(session_factory) -> AuthorBackfill:
+    global backfill
+    backfill = AuthorBackfill(session_factory, AUTHOR_BACKFILL_BATCH_SIZE, AUTHOR_BACKFILL_PAUSE_SECONDS)
+    return backfill
+
+@metrics.register
+def collect_author_backfill_metrics():
+    if backfill is None:
+        return {}
+    return {
+        "author_backfill_linked_total": backfill.linked,
+        "author_backfill_done": int(backfill.done),
+    }
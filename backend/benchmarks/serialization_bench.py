@@ -0,0 +1,54 @@
+# Compare the old serialization path (jsonable_encoder over ORM objects and the
+# stdlib JSONResponse) with typed response models rendered by orjson.
+# Run from the backend directory: python -m benchmarks.serialization_bench
+import json
+import time
+import orjson
+from fastapi.encoders import jsonable_encoder
+import models
+from schemas import Page, PostResponse
+
+SIZES = (10_000, 100_000)
+
+def make_posts(count: int) -> list:
+    return [
+        models.Post(
+            id=index,
+            username=f"user{index % 500}",
+            user_id=index % 500,
+            image_url=f"https://example.com/images/{index}.jpg",
+            description="A day at the beach",
+            likes=index % 1000,
+        )
+        for index in range(count)
+    ]
+
+# What FastAPI did before: encode each ORM object attribute by attribute
+def encode_untyped(posts: list) -> bytes:
+    return json.dumps(
+        jsonable_encoder({"items": posts, "next_cursor": None}),
+        ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+    ).encode("utf-8")
+
+# What FastAPI does now: validate into the response model, dump, render with orjson
+def encode_typed(posts: list) -> bytes:
+    page = Page[PostResponse].model_validate({"items": posts, "next_cursor": None})
+    return orjson.dumps(page.model_dump(mode="json"))
+
+def timed(encode, posts: list) -> float:
+    start = time.perf_counter()
+    encode(posts)
+    return time.perf_counter() - start
+
+def main():
+    for size in SIZES:
+        posts = make_posts(size)
+        untyped = timed(encode_untyped, posts)
+        typed = timed(encode_typed, posts)
+        print(
+            f"{size:>7} rows  jsonable_encoder+json {untyped:.3f}s  "
+            f"pydantic+orjson {typed:.3f}s  speedup {untyped / typed:.1f}x"
+        )
+
+if __name__ == "__main__":
+    main()
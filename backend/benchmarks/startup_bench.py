@@ -0,0 +1,97 @@
+# Measure worker cold start: how long importing the app takes, which imports
+# dominate it, and the time from process spawn to the first answered request
+# (import, lifespan start-up, one GET /metrics). Each sample is a fresh process.
+# Run from the backend directory: python -m benchmarks.startup_bench
+# The lifespan checks the schema version, so the configured database must be up.
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 5
+TOP_IMPORTS = 10
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+# Drive the ASGI lifespan and one HTTP request by hand, so no server is needed
+FIRST_REQUEST_SCRIPT = """
+import asyncio, time
+import main
+
+async def run():
+    startup = asyncio.Queue()
+    await startup.put({"type": "lifespan.startup"})
+    started = asyncio.Event()
+    async def lifespan_send(message):
+        if message["type"] == "lifespan.startup.failed":
+            raise SystemExit(message.get("message", "lifespan start-up failed"))
+        if message["type"] == "lifespan.startup.complete":
+            started.set()
+    lifespan = asyncio.create_task(main.app({"type": "lifespan", "asgi": {"version": "3.0"}}, startup.get, lifespan_send))
+    await started.wait()
+
+    status = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/metrics", "raw_path": b"/metrics", "root_path": "",
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 8000),
+    }
+    await main.app(scope, receive, send)
+    print(time.time(), status[0])
+
+    await startup.put({"type": "lifespan.shutdown"})
+    await lifespan
+
+asyncio.run(run())
+"""
+
+def run_child(script: str, *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *flags, "-c", script], capture_output=True, text=True, check=True,
+    )
+
+def import_seconds() -> float:
+    return float(run_child(IMPORT_SCRIPT).stdout.split()[-1])
+
+def first_request_seconds() -> float:
+    spawned = time.time()
+    answered, status = run_child(FIRST_REQUEST_SCRIPT).stdout.split()[-2:]
+    if status != "200":
+        raise SystemExit(f"GET /metrics answered {status}")
+    return float(answered) - spawned
+
+# Slowest imports by cumulative time, from python -X importtime
+def slowest_imports() -> list[tuple[int, str]]:
+    timings = []
+    for line in run_child(IMPORT_SCRIPT, "-X", "importtime").stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings.append((int(cumulative), name.strip()))
+    return sorted(timings, reverse=True)[:TOP_IMPORTS]
+
+def report(label: str, samples: list[float]):
+    print(
+        f"{label:<18} median {statistics.median(samples) * 1000:.1f} ms "
+        f"(min {min(samples) * 1000:.1f}, max {max(samples) * 1000:.1f}, {len(samples)} runs)"
+    )
+
+def main():
+    report("import main", [import_seconds() for _ in range(RUNS)])
+    report("first request", [first_request_seconds() for _ in range(RUNS)])
+    print("slowest imports (cumulative):")
+    for micros, name in slowest_imports():
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# Compare cached and uncached JWT verification.
+# Run from the backend directory: python -m benchmarks.token_cache_bench
+import time
+from datetime import datetime, timedelta, timezone
+from jose import jwt
+import auth
+
+ITERATIONS = 20000
+
+def make_token() -> str:
+    expire = datetime.now(timezone.utc) + timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return jwt.encode({"sub": "bench", "exp": expire}, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+
+def run(label: str, verify, token: str) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        verify(token)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {ITERATIONS} calls in {elapsed:.3f}s ({elapsed / ITERATIONS * 1e6:.1f} us/call)")
+    return elapsed
+
+def main():
+    token = make_token()
+    auth.token_cache.clear()
+    uncached = run("uncached", auth.decode_token, token)
+    cached = run("cached", auth.verify_token, token)
+    print(f"speedup    {uncached / cached:.1f}x")
+    print(f"hits={auth.token_cache.hits} misses={auth.token_cache.misses}")
+
+if __name__ == "__main__":
+    main()
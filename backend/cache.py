@@ -0,0 +1,134 @@
+# Server-side cache of serialized GET responses.
+# Entries hold the rendered JSON body together with its ETag / Last-Modified, so a
+# hit costs neither a query nor serialization, and conditional requests still get
+# 304s. Each entry is tagged with the resources it contains ("post:12",
+# "posts:head" for first pages, ...) and writes invalidate exactly those tags.
+# Keyset pagination keeps this precise: a new post can only change first pages.
+# The backend is pluggable; the in-process LRU invalidates within one worker only,
+# so RESPONSE_CACHE_TTL_SECONDS bounds staleness across workers.
+import os
+import time
+from collections import OrderedDict
+import orjson
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+import conditional
+import metrics
+
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '30'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '10000'))
+
+# Interface for cache backends storing (body, headers) entries under keys with tags
+class CacheBackend:
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float, tags: list[str]):
+        raise NotImplementedError
+
+    def invalidate_tags(self, tags: list[str]) -> int:
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+# Bounded in-process LRU with per-entry expiry and a tag -> keys index
+class LRUCacheBackend(CacheBackend):
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._tags = {}
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: float, tags: list[str]):
+        if self.maxsize <= 0:
+            return
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags: list[str]) -> int:
+        keys = set()
+        for tag in tags:
+            keys |= self._tags.get(tag, set())
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def __len__(self):
+        return len(self._entries)
+
+# Render a handler result through its response model straight to JSON bytes
+def render(model, value) -> bytes:
+    adapter = TypeAdapter(model)
+    return orjson.dumps(adapter.dump_python(adapter.validate_python(value, from_attributes=True), mode="json"))
+
+class ResponseCache:
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    # Serve a cached response (or a 304 for it), or None on a miss
+    def get(self, request: Request, key: str) -> Response | None:
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        body, headers = entry
+        return self.respond(request, body, headers)
+
+    # Store a rendered body with its validators under the given tags, for the
+    # default TTL unless a shorter one is given
+    def put(self, key: str, body: bytes, headers: dict, tags: list[str], ttl: float | None = None):
+        self.backend.set(key, (body, headers), self.ttl if ttl is None else ttl, tags)
+
+    # Drop every entry carrying any of the tags
+    def invalidate(self, *tags: str):
+        self.invalidations += self.backend.invalidate_tags(list(tags))
+
+    @staticmethod
+    def respond(request: Request, body: bytes, headers: dict) -> Response:
+        if conditional.is_fresh(request, headers):
+            return conditional.not_modified(headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+response_cache = ResponseCache(LRUCacheBackend(RESPONSE_CACHE_MAX_ENTRIES), RESPONSE_CACHE_TTL_SECONDS)
+
+@metrics.register
+def collect_cache_metrics():
+    lookups = response_cache.hits + response_cache.misses
+    return {
+        "response_cache_entries": len(response_cache.backend),
+        "response_cache_hits_total": response_cache.hits,
+        "response_cache_misses_total": response_cache.misses,
+        "response_cache_hit_ratio": round(response_cache.hits / lookups, 4) if lookups else 0,
+        "response_cache_invalidated_entries_total": response_cache.invalidations,
+    }
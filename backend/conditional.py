@@ -0,0 +1,89 @@
+# Conditional GET support for resource and list endpoints.
+# Every post, story and user carries a revision (bumped on each update) and an
+# updated_at timestamp. Responses advertise them as ETag and Last-Modified, and
+# a request whose If-None-Match / If-Modified-Since still matches gets an empty
+# 304 before the body is serialized.
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response, status
+
+# Version parts of one entity; variants count because they appear after upload,
+# and the author's revision because posts and stories show the author's name
+def _version(entity) -> str:
+    version = f"{entity.id}.{entity.revision}.{len(getattr(entity, 'variants', ()))}"
+    author = getattr(entity, 'author', None)
+    return f"{version}.{author.revision}" if author is not None else version
+
+# Last change to an entity or, for posts and stories, to its author
+def _last_modified(entity) -> datetime | None:
+    author = getattr(entity, 'author', None)
+    if author is None or author.updated_at is None:
+        return entity.updated_at
+    if entity.updated_at is None:
+        return author.updated_at
+    return max(entity.updated_at, author.updated_at)
+
+# Strong ETag for a single entity
+def entity_etag(entity) -> str:
+    return f'"{_version(entity)}"'
+
+# Strong ETag for a page: a digest of every row's version plus the next cursor
+def page_etag(rows, next_cursor: str | None) -> str:
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(_version(row).encode())
+        digest.update(b",")
+    digest.update((next_cursor or "").encode())
+    return f'"{digest.hexdigest()}"'
+
+def _http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+# ETag and Last-Modified headers for a version
+def validators(etag: str, last_modified: datetime | None) -> dict:
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+# Validators for a single entity
+def entity_validators(entity) -> dict:
+    return validators(entity_etag(entity), _last_modified(entity))
+
+# Validators for a page returned by paginate()
+def page_validators(page: dict) -> dict:
+    rows = page["items"]
+    last_modified = max(filter(None, map(_last_modified, rows)), default=None)
+    return validators(page_etag(rows, page["next_cursor"]), last_modified)
+
+# Whether the request's If-None-Match / If-Modified-Since still match the validators
+def is_fresh(request: Request, headers: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+        return "*" in candidates or headers["ETag"] in candidates
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(headers["Last-Modified"]) <= since
+    return False
+
+# Empty 304 carrying the validators
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+# Set the validators on the response and return an empty 304 if the client's
+# copy is current, otherwise None so the handler returns the body as usual
+def check(request: Request, response: Response, headers: dict):
+    if is_fresh(request, headers):
+        return not_modified(headers)
+    response.headers.update(headers)
+    return None
+
+# Conditional check for a page returned by paginate()
+def check_page(request: Request, response: Response, page: dict):
+    return check(request, response, page_validators(page))
@@ -0,0 +1,234 @@
+# Per-user likes and the like counters on posts.
+# Every like is a (user_id, post_id) row with a unique index, so liking twice or
+# unliking a post that was never liked is a no-op. posts.likes is kept in step
+# with a single server-side "UPDATE posts SET likes = likes + :delta" in the same
+# transaction, so concurrent likes never overwrite each other.
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import metrics
+import models
+from cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+# Optional write-behind for the counters: count changes are buffered and flushed
+# every LIKE_FLUSH_INTERVAL_MS or as soon as LIKE_FLUSH_MAX_EVENTS are pending.
+# The per-user like rows are always written immediately; with write-behind on,
+# posts.likes becomes eventually consistent instead of transactional.
+LIKE_WRITE_BEHIND = os.getenv('LIKE_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+LIKE_FLUSH_INTERVAL_MS = int(os.getenv('LIKE_FLUSH_INTERVAL_MS', '200'))
+LIKE_FLUSH_MAX_EVENTS = int(os.getenv('LIKE_FLUSH_MAX_EVENTS', '1000'))
+LIKE_FLUSH_BATCH_ROWS = 500
+LIKED_LOOKUP_MAX_IDS = 100
+
+# Expression for likes + delta, never below zero
+def _add_likes(delta):
+    current = func.coalesce(models.Post.likes, 0)
+    return case((current + delta < 0, 0), else_=current + delta)
+
+# Add delta to a post's like count (never below zero) without committing and
+# return the new count
+async def _update_count(db: AsyncSession, post_id: int, delta: int) -> int | None:
+    statement = (
+        update(models.Post)
+        .where(models.Post.id == post_id)
+        .values(likes=_add_likes(delta), revision=models.Post.revision + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        result = await db.execute(statement.returning(models.Post.likes))
+        return result.scalar_one_or_none()
+    # MySQL has no UPDATE ... RETURNING; read the count back inside the same transaction
+    await db.execute(statement)
+    return await db.scalar(select(models.Post.likes).where(models.Post.id == post_id))
+
+# Insert a like row inside a savepoint; False if the user already liked the post
+async def _insert_like(db: AsyncSession, user_id: int, post_id: int) -> bool:
+    try:
+        async with db.begin_nested():
+            db.add(models.Like(user_id=user_id, post_id=post_id))
+    except IntegrityError:
+        return False
+    return True
+
+# The like count as stored on the post
+async def _stored_count(db: AsyncSession, post_id: int) -> int:
+    return await db.scalar(select(func.coalesce(models.Post.likes, 0)).where(models.Post.id == post_id)) or 0
+
+# Idempotently like (liked=True) or unlike a post for a user and return the post's
+# like count afterwards, or None if the post does not exist
+async def set_liked(db: AsyncSession, user_id: int, post_id: int, liked: bool) -> int | None:
+    exists = await db.scalar(select(models.Post.id).where(models.Post.id == post_id))
+    if exists is None:
+        return None
+    if liked:
+        changed = await _insert_like(db, user_id, post_id)
+    else:
+        result = await db.execute(
+            delete(models.Like).where(models.Like.user_id == user_id, models.Like.post_id == post_id)
+        )
+        changed = result.rowcount > 0
+    delta = 1 if liked else -1
+    if changed and aggregator is None:
+        likes = await _update_count(db, post_id, delta)
+        await db.commit()
+        return likes
+    await db.commit()
+    if aggregator is None:
+        return await _stored_count(db, post_id)
+    if changed:
+        aggregator.add(post_id, delta)
+    return await aggregator.current_count(db, post_id)
+
+# Which of the given posts the user has liked, in one indexed query
+async def liked_post_ids(db: AsyncSession, user_id: int, post_ids: list[int]) -> list[int]:
+    if not post_ids:
+        return []
+    result = await db.execute(
+        select(models.Like.post_id).where(
+            models.Like.user_id == user_id, models.Like.post_id.in_(post_ids)
+        )
+    )
+    return sorted(result.scalars().all())
+
+# Apply several posts' deltas with one multi-row UPDATE per batch:
+# UPDATE posts SET likes = likes + CASE id WHEN :a THEN :da ... END WHERE id IN (...)
+async def apply_like_deltas(db: AsyncSession, deltas: dict[int, int]):
+    post_ids = list(deltas)
+    for start in range(0, len(post_ids), LIKE_FLUSH_BATCH_ROWS):
+        batch = post_ids[start:start + LIKE_FLUSH_BATCH_ROWS]
+        delta = case({post_id: deltas[post_id] for post_id in batch}, value=models.Post.id, else_=0)
+        await db.execute(
+            update(models.Post)
+            .where(models.Post.id.in_(batch))
+            .values(likes=_add_likes(delta), revision=models.Post.revision + 1)
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+
+# In-process write-behind buffer for like traffic. Likes on the same post are
+# summed into one delta and all pending deltas are written in a single batched
+# UPDATE, so a viral post costs one row update per flush instead of one per like.
+class LikeAggregator:
+    def __init__(self, session_factory, interval_ms: int, max_events: int):
+        self.session_factory = session_factory
+        self.interval = interval_ms / 1000
+        self.max_events = max_events
+        self._deltas = defaultdict(int)
+        self._events = 0
+        # Deltas of the flush in progress, counted as pending until they commit
+        self._in_flight = {}
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self.flushes = 0
+        self.flushed_events = 0
+        self.flush_errors = 0
+        self.last_flush_seconds = 0.0
+
+    # Record a like (+1) or unlike (-1); wakes the flusher once enough events are pending
+    def add(self, post_id: int, delta: int):
+        self._deltas[post_id] += delta
+        self._events += 1
+        if self._events >= self.max_events:
+            self._wake.set()
+
+    # Count change not yet committed for one post, so readers can add it to the stored count
+    def pending_delta(self, post_id: int) -> int:
+        return self._deltas.get(post_id, 0) + self._in_flight.get(post_id, 0)
+
+    # Stored count plus the uncommitted delta of one post. Read under the flush lock
+    # so a flush cannot commit between the two reads and count its delta twice.
+    async def current_count(self, db: AsyncSession, post_id: int) -> int:
+        async with self._flush_lock:
+            return max(await _stored_count(db, post_id) + self.pending_delta(post_id), 0)
+
+    @property
+    def pending_posts(self) -> int:
+        return len(self._deltas)
+
+    @property
+    def pending_events(self) -> int:
+        return self._events
+
+    # Write every pending delta. If the write fails or is cancelled, the deltas are
+    # merged back for the next flush.
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._deltas:
+                return
+            deltas, events = self._deltas, self._events
+            changed = {post_id: delta for post_id, delta in deltas.items() if delta}
+            self._deltas, self._events, self._in_flight = defaultdict(int), 0, changed
+            started = time.perf_counter()
+            try:
+                if changed:
+                    async with self.session_factory() as db:
+                        await apply_like_deltas(db, changed)
+            except BaseException as exc:
+                for post_id, delta in changed.items():
+                    self._deltas[post_id] += delta
+                self._events += events
+                if not isinstance(exc, Exception):
+                    raise
+                logger.exception("Flushing %d like deltas failed, will retry", len(changed))
+                self.flush_errors += 1
+                return
+            finally:
+                self._in_flight = {}
+            response_cache.invalidate(*(f"post:{post_id}" for post_id in changed))
+            self.last_flush_seconds = time.perf_counter() - started
+            self.flushes += 1
+            self.flushed_events += events
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    # Start the periodic flusher, called on application startup
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # Stop the flusher and write whatever is still pending, called on shutdown. The
+    # loop is asked to exit rather than cancelled, so a flush in progress completes.
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+aggregator = None
+
+# Create the process-wide aggregator bound to the primary session factory
+def init_aggregator(session_factory) -> LikeAggregator:
+    global aggregator
+    aggregator = LikeAggregator(session_factory, LIKE_FLUSH_INTERVAL_MS, LIKE_FLUSH_MAX_EVENTS)
+    return aggregator
+
+@metrics.register
+def collect_like_metrics():
+    if aggregator is None:
+        return {}
+    return {
+        "likes_unflushed_posts": aggregator.pending_posts,
+        "likes_unflushed_events": aggregator.pending_events,
+        "likes_flushes_total": aggregator.flushes,
+        "likes_flushed_events_total": aggregator.flushed_events,
+        "likes_flush_errors_total": aggregator.flush_errors,
+        "likes_last_flush_seconds": round(aggregator.last_flush_seconds, 6),
+    }
@@ -1,78 +1,160 @@
 # Import necessary modules and libraries for building the API
-from fastapi import FastAPI, HTTPException, Depends, status
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query, Request, Response, status
 from typing import Annotated
+from contextlib import asynccontextmanager
 import models
-from database import SessionLocal, engine
-from sqlalchemy.orm import Session
+from database import router, READ_YOUR_WRITES_SECONDS
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from fastapi.security import OAuth2PasswordRequestForm
 from datetime import datetime, timedelta, timezone
-from passlib.context import CryptContext
 from models import User
-import pytz
-
-# Create a FastAPI instance to define routes and handlers
-app = FastAPI()
-
-# Create all the tables in the database based on the models
-models.Base.metadata.create_all(bind=engine)
-
-# Set up the password hashing scheme using bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# Define the OAuth2 bearer scheme for token authentication
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-# Constants for JWT token creation
-SECRET_KEY = "mateo"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-# Define the base model for User-related data (request/response body for registration)
-class UserBase(BaseModel):
-    username: str
-    password: str
-
-# Define the base model for Post-related data (request/response body for posts)
-class PostBase(BaseModel):
-    username: str
-    user_id: int
-    image_url: str
-    description: str
-    likes: int
-
-# Define the base model for Story-related data (request/response body for stories)
-class StoryBase(BaseModel):
-    image_url: str
-    username: str
-
-# Model for updating a user's information
-class UserUpdate(BaseModel):
-    username: str
-    password: str
-
-# Model for updating a post
-class PostUpdate(BaseModel):
-    username: str
-    user_id: int
-    image_url: str
-    description: str
-    likes: int
-
-# Model for updating a story
-class StoryUpdate(BaseModel):
-    image_url: str
-    hashed_password: str
-
-# Dependency to get a database session, ensures proper closing after use
-def get_db():
-    db = SessionLocal()
+import time
+import logging
+import metrics
+import passwords
+from auth import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, claims_dependency, verify_token
+from pagination import PageParams, paginate
+import likes
+import timeline
+import stories
+import authors
+import usernames
+import media
+import thumbnails
+from media_response import MediaFileResponse
+import conditional
+import multiget
+import migrations
+from cache import response_cache, render
+from user_cache import MISS, CachedUser, user_cache
+from schemas import (
+    UserBase, PostBase, StoryBase, UserUpdate, PostUpdate, StoryUpdate,
+    UserResponse, PostResponse, StoryResponse, Page, Batch, LikeResponse, LikedPostsResponse,
+    FollowResponse, StoryTrayResponse, MediaResponse, UsernameAvailabilityResponse,
+)
+
+logger = logging.getLogger(__name__)
+
+# The schema is managed by "python -m migrations upgrade"; at startup only warn
+# when the primary is behind, without running any DDL
+async def check_schema_version():
+    waiting = await migrations.pending()
+    if waiting:
+        logger.warning(
+            "Database schema is %d migration(s) behind; run 'python -m migrations upgrade'",
+            len(waiting),
+        )
+
+# Everything that touches the database or starts workers runs here, when the
+# server starts, so importing this module stays cheap and side-effect free
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await check_schema_version()
+    # Start the write-behind like flusher and the reaper for expired stories
+    if likes.LIKE_WRITE_BEHIND:
+        likes.init_aggregator(router.writer()).start()
+    stories.init_reaper(router.writer()).start()
+    # Link pre-existing posts and stories to their authors in the background
+    if authors.AUTHOR_BACKFILL_ENABLED:
+        authors.init_backfill(router.writer()).start()
+    # Load existing usernames into the availability filter
+    usernames.init_filter(router.reader()).start()
     try:
-        yield db
+        yield
     finally:
-        db.close()
+        # Stop the backfill and reaper, flush buffered likes, then stop the worker processes
+        if usernames.username_filter is not None:
+            await usernames.username_filter.stop()
+        if authors.backfill is not None:
+            await authors.backfill.stop()
+        if stories.reaper is not None:
+            await stories.reaper.stop()
+        if likes.aggregator is not None:
+            await likes.aggregator.stop()
+        passwords.shutdown()
+        thumbnails.shutdown()
+        for db_engine in router.engines.values():
+            await db_engine.dispose()
+
+# Create a FastAPI instance to define routes and handlers.
+# Responses are rendered with orjson unless a route says otherwise.
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# Updates carry the revision they read; a concurrent change in between is a conflict
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request: Request, exc: StaleDataError):
+    return ORJSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": "Resource was modified concurrently, please retry"},
+    )
+
+# Cookie holding the time until which a client's reads stay on the primary
+PRIMARY_STICKY_COOKIE = "db_primary_until"
+
+# Dependency to get a primary (read-write) session, ensures proper closing after use.
+# Writes mark the client sticky so its next reads see its own changes.
+async def get_db(request: Request, response: Response):
+    if request.method != "GET":
+        response.set_cookie(
+            PRIMARY_STICKY_COOKIE,
+            str(time.time() + READ_YOUR_WRITES_SECONDS),
+            max_age=int(READ_YOUR_WRITES_SECONDS) + 1,
+            httponly=True,
+        )
+    async with router.writer()() as db:
+        yield db
+
+# Helper to tell whether a client wrote recently and must read its own writes
+def is_sticky(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(PRIMARY_STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+# Dependency to get a read session, served by a replica unless the client wrote recently
+async def get_read_db(request: Request):
+    async with router.reader(is_sticky(request))() as db:
+        yield db
+
+# Helper to serve a cacheable GET from the response cache, or load it, render it
+# through its response model and store it under its tags. Clients that wrote
+# recently bypass the cache so they never get a copy from before their write.
+# ttl, if given, maps the result to how long it may be cached instead of the default.
+async def cached_get(request: Request, key: str, model, load, validators, tags, ttl=None):
+    sticky = is_sticky(request)
+    if not sticky:
+        hit = response_cache.get(request, key)
+        if hit is not None:
+            return hit
+    result = await load()
+    headers = validators(result)
+    if conditional.is_fresh(request, headers):
+        return conditional.not_modified(headers)
+    body = render(model, result)
+    if not sticky:
+        response_cache.put(key, body, headers, tags(result), ttl(result) if ttl else None)
+    return response_cache.respond(request, body, headers)
+
+# Helper for the cache tags of a row: the row itself, plus its author for posts
+# and stories, whose responses show the author's current name
+def row_tags(kind: str, row) -> list[str]:
+    tags = [f"{kind}:{row.id}"]
+    if getattr(row, "user_id", None) is not None and kind != "user":
+        tags.append(f"user:{row.user_id}")
+    return tags
+
+# Helper for the cache tags of a list page: those of every row, plus "<kind>s:head"
+# for first pages, the only pages a newly created row can appear on
+def page_tags(kind: str, page: PageParams):
+    def tags(result: dict) -> list[str]:
+        tags = [tag for row in result["items"] for tag in row_tags(kind, row)]
+        return tags + [f"{kind}s:head"] if page.cursor is None else tags
+    return tags
 
 # CORS settings for frontend-backend communication
 app.add_middleware(
@@ -83,66 +165,93 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Dependency for DB access used in route functions
-db_dependency = Annotated[Session, Depends(get_db)]
+# Expose pool and application metrics for Prometheus scraping
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return metrics.render()
 
-# Helper function to fetch a user by username from the database
-def get_user_by_username(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+# Dependency for DB access used in route functions
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
+
+# Helper function to fetch a user's id and password hash by username, answered
+# from the user cache (including "no such user") when possible
+async def get_user_by_username(db: AsyncSession, username: str) -> CachedUser | None:
+    user = user_cache.get(username)
+    if user is not MISS:
+        return user
+    result = await db.execute(
+        select(User.id, User.username, User.hashed_password).where(User.username == username)
+    )
+    row = result.first()
+    user = CachedUser(*row) if row is not None else None
+    user_cache.put(username, user)
+    return user
 
-# Function to create a new user
-def create_user(db: Session, user: UserBase):
-    hashed_password = pwd_context.hash(user.password)
+# Function to create a new user. The unique username index settles races with a
+# concurrent registration of the same name.
+async def create_user(db: AsyncSession, user: UserBase):
+    hashed_password = await passwords.hash_password(user.password)
     db_user = User(username=user.username, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        user_cache.invalidate(user.username)
+        raise HTTPException(status_code=400, detail="Username already registered")
+    user_cache.put(db_user.username, CachedUser(db_user.id, db_user.username, db_user.hashed_password))
+    usernames.add(db_user.username)
     return "complete"
 
 # Function to authenticate a user
-def authenticate_user(username: str, password: str, db: Session):
-    user = db.query(User).filter(User.username == username).first()
+async def authenticate_user(username: str, password: str, db: AsyncSession):
+    user = await get_user_by_username(db, username)
     if not user:
         return False
-    if not pwd_context.verify(password, user.hashed_password):
+    if not await passwords.verify_password(password, user.hashed_password):
         return False
     return user
 
-# Function to create a JWT token for authenticated users
+# Function to create a JWT token for authenticated users.
+# python-jose is imported on first use to keep worker start-up fast.
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
+    from jose import jwt
     to_encode = data.copy()
     if expires_delta:
-        expire = datetime.now(pytz.utc) + expires_delta
+        expire = datetime.now(timezone.utc) + expires_delta
     else:
-        expire = datetime.now(pytz.utc) + timedelta(minutes=15)
+        expire = datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 # Function to verify a token
 @app.get("/verify-token/")
-async def verify_user_token(token: str = Depends(oauth2_scheme)):
-    # This function checks if the token is valid and returns appropriate responses
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=403, detail="Token is invalid or expired")
-        return {"message": "Token is valid"}
-    except JWTError:
-        raise HTTPException(status_code=403, detail="Token is invalid or expired")
+async def verify_user_token(claims: claims_dependency):
+    # Verified claims come from the token cache; invalid tokens are rejected with 403
+    return {"message": "Token is valid"}
 
 
 # Create Endpoints (POST)
 @app.post("/register/")
-async def register_user(user: UserBase, db: Session = Depends(get_db)):
-    db_user = get_user_by_username(db, username=user.username)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    return create_user(db=db, user=user)
+async def register_user(user: UserBase, db: AsyncSession = Depends(get_db)):
+    # Names the username filter has never seen are free without a lookup
+    if usernames.might_exist(user.username):
+        db_user = await get_user_by_username(db, username=user.username)
+        if db_user:
+            raise HTTPException(status_code=400, detail="Username already registered")
+    return await create_user(db=db, user=user)
+
+# Check whether a username is free, e.g. /usernames/available?username=ann
+@app.get("/usernames/available", status_code=status.HTTP_200_OK, response_model=UsernameAvailabilityResponse)
+async def check_username_available(db: read_db_dependency, username: str = Query(..., min_length=1, max_length=50)):
+    available = not usernames.might_exist(username) or await get_user_by_username(db, username) is None
+    return {"username": username, "available": available}
 
 @app.post("/token/")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(form_data.username, form_data.password, db)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -151,63 +260,227 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/posts/", status_code=status.HTTP_201_CREATED)
-async def create_post(post: PostBase, db: db_dependency):
-    db_post = models.Post(**post.dict())
+async def create_post(post: PostBase, db: db_dependency, background_tasks: BackgroundTasks):
+    db_post = models.Post(**post.dict(), likes=0)
     db.add(db_post)
-    db.commit()
+    await db.commit()
+    response_cache.invalidate("posts:head")
+    # Push the post into the author's and followers' home timelines after responding
+    background_tasks.add_task(timeline.fan_out_post, router.writer(), db_post.id, db_post.user_id)
+
+# Upload a file as multipart/form-data (field "file"), streamed to disk and deduplicated
+# by content hash. Returns 201 for new content and 200 for an already stored file.
+@app.post("/media", status_code=status.HTTP_201_CREATED, response_model=MediaResponse)
+async def upload_media(request: Request, response: Response, db: db_dependency, background_tasks: BackgroundTasks):
+    db_media, deduplicated = await media.save_upload(request, db)
+    if deduplicated:
+        response.status_code = status.HTTP_200_OK
+    else:
+        # Resize on the media process pool after responding
+        background_tasks.add_task(thumbnails.generate_variants, router.writer(), db_media.id)
+    return {
+        "id": db_media.id,
+        "url": media.media_url(db_media),
+        "sha256": db_media.sha256,
+        "content_type": db_media.content_type,
+        "size": db_media.size,
+        "deduplicated": deduplicated,
+    }
+
+# Follow a user as the current user, backfilling their recent posts into the home timeline
+@app.post("/users/{user_id}/follow", status_code=status.HTTP_200_OK, response_model=FollowResponse)
+async def follow_user(user_id: int, db: db_dependency, claims: claims_dependency, background_tasks: BackgroundTasks):
+    follower_id = await current_user_id(claims, db)
+    if follower_id == user_id:
+        raise HTTPException(status_code=400, detail="Users cannot follow themselves")
+    if await db.get(models.User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if await timeline.follow(db, follower_id, user_id):
+        background_tasks.add_task(timeline.backfill_follow, router.writer(), follower_id, user_id)
+    return {"user_id": user_id, "following": True}
 
-@app.post("/stories/", status_code=status.HTTP_201_CREATED)
+@app.post("/stories/", status_code=status.HTTP_201_CREATED, response_model=StoryResponse)
 async def create_story(story: StoryBase, db: db_dependency):
+    author = await get_user_by_username(db, story.username)
     db_story = models.Story(
         username=story.username,
-        image_url=story.image_url
+        user_id=author.id if author is not None else None,
+        image_url=story.image_url,
+        created_at=stories.utcnow(),
+        expires_at=stories.expiry_from_now(),
+        media_id=story.media_id,
     )
     db.add(db_story)
-    db.commit()
-    db.refresh(db_story)
+    await db.commit()
+    await db.refresh(db_story)
+    response_cache.invalidate("stories:head")
     return db_story
 
-# Read Endpoints (GET)
-@app.get("/posts/", status_code=status.HTTP_200_OK)
-async def get_all_posts(db: db_dependency):
-    posts = db.query(models.Post).all()
-    return posts
-
-@app.get("/posts/{post_id}", status_code=status.HTTP_200_OK)
-async def read_post(post_id: int, db: db_dependency):
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if post is None:
+# Helper to resolve the id of the user behind a token; older tokens only carry the username
+async def current_user_id(claims: dict, db: AsyncSession) -> int:
+    user_id = claims.get("uid")
+    if user_id is not None:
+        return user_id
+    user = await get_user_by_username(db, claims["sub"])
+    if user is None:
+        raise HTTPException(status_code=403, detail="Token is invalid or expired")
+    return user.id
+
+# Helper to like or unlike a post for the current user, idempotently
+async def record_like(db: AsyncSession, claims: dict, post_id: int, liked: bool):
+    user_id = await current_user_id(claims, db)
+    count = await likes.set_liked(db, user_id, post_id, liked)
+    if count is None:
         raise HTTPException(status_code=404, detail="Post not found")
-    return post
+    response_cache.invalidate(f"post:{post_id}")
+    return {"post_id": post_id, "liked": liked, "likes": count}
 
-@app.get("/users/", status_code=status.HTTP_200_OK)
-async def get_all_users(db: db_dependency):
-    users = db.query(models.User).all()
-    return users
+@app.post("/posts/{post_id}/like", status_code=status.HTTP_200_OK, response_model=LikeResponse)
+async def like_post(post_id: int, db: db_dependency, claims: claims_dependency):
+    return await record_like(db, claims, post_id, True)
 
-@app.get("/users/{user_id}", status_code=status.HTTP_200_OK)
-async def read_user(user_id: int, db: db_dependency):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+# Read Endpoints (GET)
+# Home timeline of the current user, precomputed at post time plus followed celebrities
+@app.get("/timeline/", status_code=status.HTTP_200_OK, response_model=Page[PostResponse])
+async def get_home_timeline(request: Request, response: Response, db: read_db_dependency, claims: claims_dependency, page: PageParams = Depends()):
+    user_id = await current_user_id(claims, db)
+    result = await timeline.home_timeline_page(db, user_id, page)
+    return conditional.check_page(request, response, result) or result
+
+@app.get("/posts/", status_code=status.HTTP_200_OK, response_model=Page[PostResponse])
+async def get_all_posts(request: Request, db: read_db_dependency, page: PageParams = Depends()):
+    return await cached_get(
+        request, f"posts:{page.limit}:{page.cursor or ''}", Page[PostResponse],
+        lambda: paginate(db, models.Post, page), conditional.page_validators, page_tags("post", page),
+    )
 
-@app.get("/stories/", status_code=status.HTTP_200_OK)
-async def get_all_stories(db: db_dependency):
-    stories = db.query(models.Story).all()
-    return stories
+# Multi-get of posts by id in one query, e.g. /posts?ids=3&ids=1
+@app.get("/posts", status_code=status.HTTP_200_OK, response_model=Batch[PostResponse])
+async def get_posts_by_id(db: read_db_dependency, ids: list[int] = Query(..., max_length=multiget.MULTI_GET_MAX_IDS)):
+    return await multiget.get_many(db, models.Post, ids)
+
+@app.get("/posts/{post_id}", status_code=status.HTTP_200_OK, response_model=PostResponse)
+async def read_post(post_id: int, request: Request, db: read_db_dependency):
+    async def load():
+        post = await db.get(models.Post, post_id)
+        if post is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+        return post
+    return await cached_get(
+        request, f"post:{post_id}", PostResponse, load,
+        conditional.entity_validators, lambda post: row_tags("post", post),
+    )
 
-@app.get("/stories/{story_id}", status_code=status.HTTP_200_OK)
-async def read_story(story_id: int, db: db_dependency):
-    story = db.query(models.Story).filter(models.Story.id == story_id).first()
-    if story is None:
-        raise HTTPException(status_code=404, detail="Story not found")
-    return story
+# Batch lookup of which posts the current user liked, e.g. /likes/?post_ids=1&post_ids=2
+@app.get("/likes/", status_code=status.HTTP_200_OK, response_model=LikedPostsResponse)
+async def get_liked_posts(
+    db: read_db_dependency,
+    claims: claims_dependency,
+    post_ids: list[int] = Query(..., max_length=likes.LIKED_LOOKUP_MAX_IDS),
+):
+    user_id = await current_user_id(claims, db)
+    return {"liked_post_ids": await likes.liked_post_ids(db, user_id, post_ids)}
+
+@app.get("/users/", status_code=status.HTTP_200_OK, response_model=Page[UserResponse])
+async def get_all_users(request: Request, response: Response, db: read_db_dependency, page: PageParams = Depends()):
+    result = await paginate(db, models.User, page)
+    return conditional.check_page(request, response, result) or result
+
+# Multi-get of users by id in one query, e.g. /users?ids=3&ids=1
+@app.get("/users", status_code=status.HTTP_200_OK, response_model=Batch[UserResponse])
+async def get_users_by_id(db: read_db_dependency, ids: list[int] = Query(..., max_length=multiget.MULTI_GET_MAX_IDS)):
+    return await multiget.get_many(db, models.User, ids)
+
+@app.get("/users/{user_id}", status_code=status.HTTP_200_OK, response_model=UserResponse)
+async def read_user(user_id: int, request: Request, db: read_db_dependency):
+    async def load():
+        user = await db.get(models.User, user_id)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user
+    return await cached_get(
+        request, f"user:{user_id}", UserResponse, load,
+        conditional.entity_validators, lambda user: row_tags("user", user),
+    )
+
+@app.get("/stories/", status_code=status.HTTP_200_OK, response_model=Page[StoryResponse])
+async def get_all_stories(request: Request, db: read_db_dependency, page: PageParams = Depends()):
+    return await cached_get(
+        request, f"stories:{page.limit}:{page.cursor or ''}", Page[StoryResponse],
+        lambda: paginate(db, models.Story, page, query=stories.live_stories_query()),
+        conditional.page_validators, page_tags("story", page),
+        ttl=lambda result: stories.cache_ttl(result["items"], response_cache.ttl),
+    )
+
+# Multi-get of live stories by id in one query; expired stories count as missing
+@app.get("/stories", status_code=status.HTTP_200_OK, response_model=Batch[StoryResponse])
+async def get_stories_by_id(db: read_db_dependency, ids: list[int] = Query(..., max_length=multiget.MULTI_GET_MAX_IDS)):
+    return await multiget.get_many(db, models.Story, ids, query=stories.live_stories_query())
+
+# Serve a stored upload with a content-hash ETag, immutable caching and byte ranges.
+# HEAD is routed too, so clients can read the size and ETag without the body.
+@app.api_route("/media/{media_id}", methods=["GET", "HEAD"], status_code=status.HTTP_200_OK)
+async def read_media(media_id: int, request: Request, db: read_db_dependency):
+    result = await db.execute(
+        select(models.Media.sha256, models.Media.content_type).where(models.Media.id == media_id)
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    return MediaFileResponse(media.media_path(row.sha256), f'"{row.sha256}"', row.content_type, request)
+
+# Serve a resized variant of a stored upload the same way
+@app.api_route("/media/{media_id}/variants/{width}", methods=["GET", "HEAD"], status_code=status.HTTP_200_OK)
+async def read_media_variant(media_id: int, width: int, request: Request, db: read_db_dependency):
+    result = await db.execute(
+        select(models.Media.sha256, models.MediaVariant.content_type)
+        .join(models.MediaVariant, models.MediaVariant.media_id == models.Media.id)
+        .where(models.Media.id == media_id, models.MediaVariant.width == width)
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Media variant not found")
+    return MediaFileResponse(
+        thumbnails.variant_path(row.sha256, width), f'"{row.sha256}-w{width}"', row.content_type, request
+    )
+
+# Live stories grouped by author for the story tray. Declared before
+# /stories/{story_id} so "tray" is not parsed as an id. The tray is the same
+# for every viewer and is cached like other reads, but only for
+# STORY_TRAY_TTL_SECONDS and never past the expiry of a story it shows.
+@app.get("/stories/tray", status_code=status.HTTP_200_OK, response_model=StoryTrayResponse)
+async def get_story_tray(request: Request, db: read_db_dependency):
+    async def load():
+        return {"authors": await stories.story_tray(db)}
+    def tray_stories(tray: dict) -> list:
+        return [story for author in tray["authors"] for story in author["stories"]]
+    def validators(tray: dict) -> dict:
+        headers = conditional.page_validators({"items": tray_stories(tray), "next_cursor": None})
+        return {**headers, "Cache-Control": f"max-age={stories.STORY_TRAY_TTL_SECONDS}"}
+    def tags(tray: dict) -> list[str]:
+        return [tag for story in tray_stories(tray) for tag in row_tags("story", story)] + ["stories:head"]
+    return await cached_get(
+        request, "stories:tray", StoryTrayResponse, load, validators, tags,
+        ttl=lambda tray: stories.cache_ttl(tray_stories(tray), stories.STORY_TRAY_TTL_SECONDS),
+    )
+
+@app.get("/stories/{story_id}", status_code=status.HTTP_200_OK, response_model=StoryResponse)
+async def read_story(story_id: int, request: Request, db: read_db_dependency):
+    async def load():
+        story = await db.get(models.Story, story_id)
+        if story is None or story.expires_at <= stories.utcnow():
+            raise HTTPException(status_code=404, detail="Story not found")
+        return story
+    return await cached_get(
+        request, f"story:{story_id}", StoryResponse, load,
+        conditional.entity_validators, lambda story: row_tags("story", story),
+        ttl=lambda story: stories.cache_ttl([story], response_cache.ttl),
+    )
 
 @app.get("/verify-token/{token}")
 async def verify_user_token(token: str):
@@ -215,59 +488,85 @@ async def verify_user_token(token: str):
     return {"message": "Token is valid"}
 
 # Update Endpoints (PUT)
-@app.put("/posts/{post_id}", status_code=status.HTTP_200_OK)
+@app.put("/posts/{post_id}", status_code=status.HTTP_200_OK, response_model=PostResponse)
 async def update_post(post_id: int, post_update: PostUpdate, db: db_dependency):
-    db_post = db.query(models.Post).filter(models.Post.id == post_id).first()
+    db_post = await db.get(models.Post, post_id)
     if db_post is None:
         raise HTTPException(status_code=404, detail="Post not found")
     for key, value in post_update.dict().items():
         setattr(db_post, key, value)
-    db.commit()
+    await db.commit()
+    # The loaded author is still the old one if user_id changed
+    await db.refresh(db_post, attribute_names=["author"])
+    response_cache.invalidate(f"post:{post_id}")
     return db_post
 
-@app.put("/users/{user_id}", status_code=status.HTTP_200_OK)
+@app.put("/users/{user_id}", status_code=status.HTTP_200_OK, response_model=UserResponse)
 async def update_user(user_id: int, user_update: UserUpdate, db: db_dependency):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = await db.get(models.User, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    old_username = db_user.username
     for key, value in user_update.dict().items():
         setattr(db_user, key, value)
-    db.commit()
+    await db.commit()
+    response_cache.invalidate(f"user:{user_id}")
+    user_cache.invalidate(old_username, db_user.username)
+    usernames.add(db_user.username)
     return db_user
 
-@app.put("/stories/{story_id}", status_code=status.HTTP_200_OK)
+@app.put("/stories/{story_id}", status_code=status.HTTP_200_OK, response_model=StoryResponse)
 async def update_story(story_id: int, story_update: StoryUpdate, db: db_dependency):
-    db_story = db.query(models.Story).filter(models.Story.id == story_id).first()
+    db_story = await db.get(models.Story, story_id)
     if db_story is None:
         raise HTTPException(status_code=404, detail="Story not found")
     for key, value in story_update.dict().items():
         setattr(db_story, key, value)
-    db.commit()
+    await db.commit()
+    response_cache.invalidate(f"story:{story_id}")
     return db_story
 
 # Delete Endpoints (DELETE)
+@app.delete("/posts/{post_id}/like", status_code=status.HTTP_200_OK, response_model=LikeResponse)
+async def unlike_post(post_id: int, db: db_dependency, claims: claims_dependency):
+    return await record_like(db, claims, post_id, False)
+
+# Unfollow a user as the current user, dropping their posts from the home timeline
+@app.delete("/users/{user_id}/follow", status_code=status.HTTP_200_OK, response_model=FollowResponse)
+async def unfollow_user(user_id: int, db: db_dependency, claims: claims_dependency, background_tasks: BackgroundTasks):
+    follower_id = await current_user_id(claims, db)
+    followers = await timeline.unfollow(db, follower_id, user_id)
+    # No longer a celebrity: their recent posts must now live in followers' timelines
+    if timeline.dropped_below_threshold(followers):
+        background_tasks.add_task(timeline.backfill_followers, router.writer(), user_id)
+    return {"user_id": user_id, "following": False}
+
 @app.delete("/posts/{post_id}", status_code=status.HTTP_200_OK)
 async def delete_post(post_id: int, db: db_dependency):
-    db_post = db.query(models.Post).filter(models.Post.id == post_id).first()
+    db_post = await db.get(models.Post, post_id)
     if db_post is None:
         raise HTTPException(status_code=404, detail="Post not found")
-    db.delete(db_post)
-    db.commit()
+    await db.delete(db_post)
+    await db.commit()
+    response_cache.invalidate(f"post:{post_id}")
 
 @app.delete("/users/{user_id}", status_code=status.HTTP_200_OK)
 async def delete_user(user_id: int, db: db_dependency):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = await db.get(models.User, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(db_user)
-    db.commit()
+    await db.delete(db_user)
+    await db.commit()
+    response_cache.invalidate(f"user:{user_id}")
+    user_cache.invalidate(db_user.username)
     return {"detail": "User deleted successfully"}
 
 @app.delete("/stories/{story_id}", status_code=status.HTTP_200_OK)
 async def delete_story(story_id: int, db: db_dependency):
-    db_story = db.query(models.Story).filter(models.Story.id == story_id).first()
+    db_story = await db.get(models.Story, story_id)
     if db_story is None:
         raise HTTPException(status_code=404, detail="Story not found")
-    db.delete(db_story)
-    db.commit()
+    await db.delete(db_story)
+    await db.commit()
+    response_cache.invalidate(f"story:{story_id}")
     return {"detail": "Story deleted successfully"}
@@ -0,0 +1,149 @@
+# Streaming media uploads with content-hash dedupe.
+# The multipart body is parsed incrementally with python-multipart as it arrives
+# and written to disk in MEDIA_CHUNK_SIZE blocks, so an upload is never held in
+# memory as a whole. The SHA-256 of the content is computed during the stream;
+# if that hash is already stored the temporary file is dropped and the existing
+# media row is returned instead of storing the same bytes again.
+import asyncio
+import hashlib
+import os
+import tempfile
+from fastapi import HTTPException, Request, status
+from multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', 'media')
+MEDIA_BASE_URL = os.getenv('MEDIA_BASE_URL', 'http://localhost:8000')
+MEDIA_CHUNK_SIZE = int(os.getenv('MEDIA_CHUNK_SIZE', str(1024 * 1024)))
+MEDIA_MAX_BYTES = int(os.getenv('MEDIA_MAX_BYTES', str(50 * 1024 * 1024)))
+MEDIA_ALLOWED_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'video/mp4'}
+# Name of the multipart field carrying the file
+MEDIA_FIELD = b'file'
+
+# Where a stored file lives on disk, sharded by the first two hex digits of its hash
+def media_path(sha256: str) -> str:
+    return os.path.join(MEDIA_ROOT, sha256[:2], sha256)
+
+# Public URL for a media row, usable as a post's or story's image_url
+def media_url(media: models.Media) -> str:
+    return f"{MEDIA_BASE_URL}/media/{media.id}"
+
+# Collects python-multipart callbacks for the file field: its headers, a running
+# hash and size, and the bytes received but not written to disk yet
+class _FilePart:
+    def __init__(self, boundary: bytes):
+        self.parser = MultipartParser(boundary, callbacks={
+            'on_part_begin': self._on_part_begin,
+            'on_header_field': self._on_header_field,
+            'on_header_value': self._on_header_value,
+            'on_header_end': self._on_header_end,
+            'on_headers_finished': self._on_headers_finished,
+            'on_part_data': self._on_part_data,
+            'on_part_end': self._on_part_end,
+        })
+        self.found = False
+        self.content_type = None
+        self.size = 0
+        self.hasher = hashlib.sha256()
+        self.pending = bytearray()
+        self._headers = {}
+        self._field = bytearray()
+        self._value = bytearray()
+        self._in_file = False
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data, start, end):
+        self._field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[bytes(self._field).lower()] = bytes(self._value)
+        self._field.clear()
+        self._value.clear()
+
+    def _on_headers_finished(self):
+        _, params = parse_options_header(self._headers.get(b'content-disposition', b''))
+        if params.get(b'name') == MEDIA_FIELD and not self.found:
+            self.found = True
+            self._in_file = True
+            content_type, _ = parse_options_header(
+                self._headers.get(b'content-type', b'application/octet-stream')
+            )
+            self.content_type = content_type.decode('latin-1').lower()
+
+    def _on_part_data(self, data, start, end):
+        if self._in_file:
+            chunk = data[start:end]
+            self.pending += chunk
+            self.size += len(chunk)
+            self.hasher.update(chunk)
+
+    def _on_part_end(self):
+        self._in_file = False
+
+    # Remove and return the next full block, or everything left when final
+    def take_block(self, final: bool = False) -> bytes | None:
+        if not self.pending or (len(self.pending) < MEDIA_CHUNK_SIZE and not final):
+            return None
+        block = bytes(self.pending[:MEDIA_CHUNK_SIZE])
+        del self.pending[:MEDIA_CHUNK_SIZE]
+        return block
+
+# Stream the request body through the parser, writing the file part out in full blocks
+async def _receive_to_file(request: Request, part: _FilePart, file) -> None:
+    async for chunk in request.stream():
+        part.parser.write(chunk)
+        if part.size > MEDIA_MAX_BYTES:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+        if part.found and part.content_type not in MEDIA_ALLOWED_TYPES:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unsupported media type")
+        while (block := part.take_block()) is not None:
+            await asyncio.to_thread(file.write, block)
+    part.parser.finalize()
+    while (block := part.take_block(final=True)) is not None:
+        await asyncio.to_thread(file.write, block)
+
+# Store an uploaded file, returning (media row, whether it was already stored)
+async def save_upload(request: Request, db: AsyncSession) -> tuple[models.Media, bool]:
+    content_type, params = parse_options_header(request.headers.get('content-type', ''))
+    if content_type != b'multipart/form-data' or b'boundary' not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+    part = _FilePart(params[b'boundary'])
+
+    tmp_dir = os.path.join(MEDIA_ROOT, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            await _receive_to_file(request, part, file)
+        if not part.found or part.size == 0:
+            raise HTTPException(status_code=400, detail="Missing file field")
+        sha256 = part.hasher.hexdigest()
+
+        existing = await db.scalar(select(models.Media).where(models.Media.sha256 == sha256))
+        if existing is not None:
+            return existing, True
+
+        path = media_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        media = models.Media(sha256=sha256, content_type=part.content_type, size=part.size)
+        db.add(media)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # A concurrent upload of the same bytes won; its file is identical
+            await db.rollback()
+            existing = await db.scalar(select(models.Media).where(models.Media.sha256 == sha256))
+            return existing, True
+        return media, False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,132 @@
+# File responses for stored media: strong ETags, immutable caching, conditional
+# requests and single byte ranges. Stored files are content-addressed and never
+# change, so the content hash is a strong ETag and clients may cache forever.
+# When the ASGI server advertises the "http.response.zerocopysend" extension the
+# body is handed to the kernel with sendfile; otherwise it is streamed in chunks
+# read off the event loop.
+import os
+import re
+import anyio
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Whether an If-None-Match header value matches the ETag
+def etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+# Parse a single "bytes=" range against the file size into (start, end) inclusive.
+# Returns None to serve the whole file, or raises ValueError if unsatisfiable.
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if match is None:
+        # Multiple or malformed ranges: the whole file is an allowed answer
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+class MediaFileResponse(Response):
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: str, etag: str, media_type: str, request: Request):
+        self.path = path
+        self.media_type = media_type
+        self.background = None
+        self.request = request
+        self.etag = etag
+        self.status_code = 200
+        self.init_headers({
+            "etag": etag,
+            "cache-control": IMMUTABLE_CACHE_CONTROL,
+            "accept-ranges": "bytes",
+        })
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        headers = self.request.headers
+        if etag_matches(headers.get("if-none-match"), self.etag):
+            await self._send_empty(send, 304)
+            return
+
+        try:
+            size = (await anyio.to_thread.run_sync(os.stat, self.path)).st_size
+        except FileNotFoundError:
+            await self._send_empty(send, 404)
+            return
+
+        # If-Range with a different validator means the client's partial copy is stale
+        range_header = headers.get("range")
+        if_range = headers.get("if-range")
+        if if_range is not None and if_range.strip() != self.etag:
+            range_header = None
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            self.headers["content-range"] = f"bytes */{size}"
+            await self._send_empty(send, 416)
+            return
+
+        if byte_range is None:
+            start, end, status = 0, size - 1, 200
+        else:
+            start, end = byte_range
+            status = 206
+            self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        count = end - start + 1 if size else 0
+        self.headers["content-length"] = str(count)
+
+        await send({"type": "http.response.start", "status": status, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD" or count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            await self._send_zero_copy(send, start, count)
+        else:
+            await self._send_chunks(send, start, count)
+
+    async def _send_empty(self, send: Send, status: int) -> None:
+        if status != 304:
+            self.headers["content-length"] = "0"
+        await send({"type": "http.response.start", "status": status, "headers": self.raw_headers})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _send_zero_copy(self, send: Send, start: int, count: int) -> None:
+        with open(self.path, "rb") as file:
+            await send({
+                "type": "http.response.zerocopysend",
+                "file": file.fileno(),
+                "offset": start,
+                "count": count,
+                "more_body": False,
+            })
+
+    async def _send_chunks(self, send: Send, start: int, count: int) -> None:
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(start)
+            remaining = count
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,18 @@
+# Minimal metrics registry rendered in the Prometheus text exposition format.
+# Components register a collector returning {metric_name: value} and the
+# /metrics endpoint renders every collector on each scrape.
+
+_collectors = []
+
+# Register a collector function, usable as a decorator
+def register(collector):
+    _collectors.append(collector)
+    return collector
+
+# Render every registered collector as "name value" lines
+def render() -> str:
+    lines = []
+    for collector in _collectors:
+        for name, value in collector().items():
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
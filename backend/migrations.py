@@ -0,0 +1,266 @@
+# Versioned schema migrations. The app never runs DDL; apply pending migrations
+# before starting (or deploying) it, from the backend directory:
+#
+#     python -m migrations upgrade     apply every pending migration
+#     python -m migrations status      show the current and latest version
+#
+# Each migration runs once per database, in its own transaction, and is recorded
+# in the schema_migrations table. Steps check the live schema before changing it,
+# so databases created by the old create_all at startup (which never added
+# columns or indexes to existing tables) are brought up to date the same way as
+# empty ones. Only the primary is migrated; replicas receive the DDL through
+# replication.
+import asyncio
+import sys
+from sqlalchemy import (
+    Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, func, inspect, select, text,
+)
+from sqlalchemy.schema import CreateColumn
+from database import engine
+
+EPOCH = text("'1970-01-01 00:00:00'")
+
+version_table = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('description', String(255), nullable=False),
+    Column('applied_at', DateTime, server_default=func.now(), nullable=False),
+)
+
+def _quote(conn, name: str) -> str:
+    return conn.dialect.identifier_preparer.quote(name)
+
+def _columns(conn, table: str) -> set[str]:
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+def _indexes(conn, table: str) -> set[str]:
+    return {index['name'] for index in inspect(conn).get_indexes(table)}
+
+# Create the tables of a frozen schema that do not exist yet, with their indexes
+def create_tables(conn, schema: MetaData):
+    schema.create_all(conn, checkfirst=True)
+
+# ALTER TABLE ... ADD COLUMN, unless the column is already there. NOT NULL columns
+# need a constant server default so existing rows can be filled in.
+def add_column(conn, table: str, column: Column):
+    if column.name in _columns(conn, table):
+        return
+    spec = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {_quote(conn, table)} ADD COLUMN {spec}"))
+
+# Add a foreign key constraint to an existing column. SQLite cannot add
+# constraints to existing tables, so there the column stays a plain integer.
+def add_foreign_key(conn, table: str, column: str, referred: str, ondelete: str):
+    if conn.dialect.name == 'sqlite':
+        return
+    for fk in inspect(conn).get_foreign_keys(table):
+        if fk['constrained_columns'] == [column]:
+            return
+    q = lambda name: _quote(conn, name)
+    conn.execute(text(
+        f"ALTER TABLE {q(table)} ADD CONSTRAINT {q(f'fk_{table}_{column}')} "
+        f"FOREIGN KEY ({q(column)}) REFERENCES {q(referred)} (id) ON DELETE {ondelete}"
+    ))
+
+# Change a column's type. SQLite ignores VARCHAR lengths, so nothing to do there.
+def alter_type(conn, table: str, column: str, type_):
+    q = lambda name: _quote(conn, name)
+    compiled = type_.compile(dialect=conn.dialect)
+    if conn.dialect.name == 'mysql':
+        conn.execute(text(f"ALTER TABLE {q(table)} MODIFY COLUMN {q(column)} {compiled}"))
+    elif conn.dialect.name == 'postgresql':
+        conn.execute(text(f"ALTER TABLE {q(table)} ALTER COLUMN {q(column)} TYPE {compiled}"))
+
+# Create an index on columns of an existing table, unless an index of that name exists
+def create_index(conn, table: str, name: str, *columns: str, unique: bool = False):
+    if name in _indexes(conn, table):
+        return
+    reflected = Table(table, MetaData(), autoload_with=conn)
+    Index(name, *(reflected.c[column] for column in columns), unique=unique).create(conn)
+
+# The tables as they stood when versioned migrations were introduced. This is a
+# frozen copy, not the models: a later model change needs a new migration, and
+# must not change what this one creates.
+initial_schema = MetaData()
+
+Table(
+    'users', initial_schema,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('username', String(50), unique=True),
+    Column('hashed_password', String(128)),
+    Column('follower_count', Integer, nullable=False, server_default='0'),
+    Column('revision', Integer, nullable=False, server_default='1'),
+    Column('updated_at', DateTime, nullable=False),
+)
+
+Table(
+    'media', initial_schema,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('sha256', String(64), nullable=False),
+    Column('content_type', String(100), nullable=False),
+    Column('size', Integer, nullable=False),
+    Column('created_at', DateTime, server_default=func.now(), nullable=False),
+    Index('ix_media_sha256', 'sha256', unique=True),
+)
+
+Table(
+    'media_variants', initial_schema,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('media_id', Integer, ForeignKey('media.id', ondelete='CASCADE'), nullable=False),
+    Column('width', Integer, nullable=False),
+    Column('height', Integer, nullable=False),
+    Column('content_type', String(100), nullable=False),
+    Column('size', Integer, nullable=False),
+    Index('ix_media_variants_media_id_width', 'media_id', 'width', unique=True),
+)
+
+Table(
+    'posts', initial_schema,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('username', String(50)),
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True),
+    Column('image_url', String(255)),
+    Column('description', String(100)),
+    Column('likes', Integer),
+    Column('media_id', Integer, ForeignKey('media.id', ondelete='SET NULL'), nullable=True),
+    Column('revision', Integer, nullable=False, server_default='1'),
+    Column('updated_at', DateTime, nullable=False),
+    Index('ix_posts_user_id_id', 'user_id', 'id'),
+    Index('ix_posts_username', 'username'),
+)
+
+Table(
+    'stories', initial_schema,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('image_url', String(255), index=True),
+    Column('username', String(50), index=True),
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True, index=True),
+    Column('created_at', DateTime, nullable=False),
+    Column('expires_at', DateTime, nullable=False, index=True),
+    Column('media_id', Integer, ForeignKey('media.id', ondelete='SET NULL'), nullable=True),
+    Column('revision', Integer, nullable=False, server_default='1'),
+    Column('updated_at', DateTime, nullable=False),
+)
+
+Table(
+    'likes', initial_schema,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+    Column('post_id', Integer, ForeignKey('posts.id', ondelete='CASCADE'), nullable=False, index=True),
+    Column('created_at', DateTime, server_default=func.now(), nullable=False),
+    Index('ix_likes_user_id_post_id', 'user_id', 'post_id', unique=True),
+)
+
+Table(
+    'follows', initial_schema,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('follower_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+    Column('followee_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+    Column('created_at', DateTime, server_default=func.now(), nullable=False),
+    Index('ix_follows_follower_id_followee_id', 'follower_id', 'followee_id', unique=True),
+    Index('ix_follows_followee_id', 'followee_id'),
+)
+
+Table(
+    'timeline_entries', initial_schema,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+    Column('post_id', Integer, ForeignKey('posts.id', ondelete='CASCADE'), nullable=False),
+    Column('author_id', Integer, nullable=False),
+    Index('ix_timeline_entries_user_id_post_id', 'user_id', 'post_id', unique=True),
+    Index('ix_timeline_entries_user_id_author_id', 'user_id', 'author_id'),
+)
+
+def _0001_initial_schema(conn):
+    create_tables(conn, initial_schema)
+
+def _0002_columns_since_first_release(conn):
+    add_column(conn, 'users', Column('follower_count', Integer, nullable=False, server_default='0'))
+    for table in ('users', 'posts', 'stories'):
+        add_column(conn, table, Column('revision', Integer, nullable=False, server_default='1'))
+        if 'updated_at' not in _columns(conn, table):
+            add_column(conn, table, Column('updated_at', DateTime, nullable=False, server_default=EPOCH))
+            conn.execute(text(f"UPDATE {_quote(conn, table)} SET updated_at = CURRENT_TIMESTAMP"))
+    for table in ('posts', 'stories'):
+        add_column(conn, table, Column('media_id', Integer, nullable=True))
+        add_foreign_key(conn, table, 'media_id', 'media', 'SET NULL')
+    # Stories from before expiry existed get the epoch and are reaped on the next pass
+    add_column(conn, 'stories', Column('created_at', DateTime, nullable=False, server_default=EPOCH))
+    add_column(conn, 'stories', Column('expires_at', DateTime, nullable=False, server_default=EPOCH))
+
+def _0003_bounded_strings(conn):
+    alter_type(conn, 'users', 'hashed_password', String(128))
+    alter_type(conn, 'posts', 'username', String(50))
+    alter_type(conn, 'stories', 'username', String(50))
+    alter_type(conn, 'stories', 'image_url', String(255))
+
+def _0004_secondary_indexes(conn):
+    create_index(conn, 'posts', 'ix_posts_user_id_id', 'user_id', 'id')
+    create_index(conn, 'posts', 'ix_posts_username', 'username')
+    create_index(conn, 'stories', 'ix_stories_username', 'username')
+    create_index(conn, 'stories', 'ix_stories_expires_at', 'expires_at')
+
+def _0005_author_foreign_keys(conn):
+    # Posts pointing at users that no longer exist are re-linked by name by the
+    # author backfill, or keep no author
+    conn.execute(text(
+        "UPDATE posts SET user_id = NULL "
+        "WHERE user_id IS NOT NULL AND user_id NOT IN (SELECT id FROM users)"
+    ))
+    add_foreign_key(conn, 'posts', 'user_id', 'users', 'SET NULL')
+    add_column(conn, 'stories', Column('user_id', Integer, nullable=True))
+    add_foreign_key(conn, 'stories', 'user_id', 'users', 'SET NULL')
+    create_index(conn, 'stories', 'ix_stories_user_id', 'user_id')
+
+MIGRATIONS = [
+    (1, "Initial schema", _0001_initial_schema),
+    (2, "Columns added to users, posts and stories since the first release", _0002_columns_since_first_release),
+    (3, "Bounded username columns and wider password hashes", _0003_bounded_strings),
+    (4, "Secondary and composite indexes on posts and stories", _0004_secondary_indexes),
+    (5, "Author foreign keys on posts and stories", _0005_author_foreign_keys),
+]
+HEAD = MIGRATIONS[-1][0]
+
+# Versions already applied to the database, without creating anything
+def applied_versions(conn) -> set[int]:
+    if not inspect(conn).has_table(version_table.name):
+        return set()
+    return set(conn.execute(select(version_table.c.version)).scalars())
+
+# Migrations not yet applied to the database behind an async engine
+async def pending(db_engine=engine) -> list[tuple]:
+    async with db_engine.connect() as conn:
+        applied = await conn.run_sync(applied_versions)
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+# Apply every pending migration in order, returning the versions applied
+async def upgrade(db_engine=engine) -> list[int]:
+    async with db_engine.begin() as conn:
+        await conn.run_sync(version_table.create, checkfirst=True)
+    done = []
+    for version, description, migrate in await pending(db_engine):
+        async with db_engine.begin() as conn:
+            await conn.run_sync(migrate)
+            await conn.execute(version_table.insert().values(version=version, description=description))
+        print(f"Applied {version:04d} {description}")
+        done.append(version)
+    return done
+
+async def main(argv: list[str]):
+    command = argv[0] if argv else 'status'
+    try:
+        if command == 'upgrade':
+            if not await upgrade():
+                print(f"Already at version {HEAD:04d}")
+        elif command == 'status':
+            waiting = await pending()
+            print(f"Latest version {HEAD:04d}, {len(waiting)} pending")
+            for version, description, _ in waiting:
+                print(f"  {version:04d} {description}")
+        else:
+            sys.exit(f"Unknown command {command!r}; use 'upgrade' or 'status'")
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -1,29 +1,157 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, func
+from sqlalchemy.orm import relationship
+from datetime import datetime, timezone
 from database import Base
 
+# Current UTC time as a naive datetime, matching the DateTime columns
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class User(Base):
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True)
-    hashed_password = Column(String(50))
+    # bcrypt hashes are 60 characters; leave room for other schemes
+    hashed_password = Column(String(128))
+    # Maintained by follow/unfollow; decides whether the user's posts are fanned out
+    follower_count = Column(Integer, default=0, server_default='0', nullable=False)
+    # Resource version for ETag / Last-Modified; revision is bumped by every ORM update
+    revision = Column(Integer, nullable=False, server_default='1')
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow, nullable=False)
+
+    __mapper_args__ = {'version_id_col': revision}
 
 class Post(Base):
     __tablename__ = 'posts'
 
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String)
-    user_id = Column(Integer)
+    # Name at posting time; responses show the author's current name when known
+    username = Column(String(50))
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
     image_url = Column(String(255))
     description = Column(String(100))
     likes = Column(Integer)
+    media_id = Column(Integer, ForeignKey('media.id', ondelete='SET NULL'), nullable=True)
+    # Resource version; bulk like updates bump revision explicitly
+    revision = Column(Integer, nullable=False, server_default='1')
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow, nullable=False)
+
+    # Uploaded media, its variants and the authors load in one batched query each per page
+    media = relationship('Media', lazy='selectin')
+    author = relationship('User', lazy='selectin')
+
+    @property
+    def variants(self):
+        return self.media.variants if self.media is not None else []
+
+    @property
+    def author_name(self):
+        return self.author.username if self.author is not None else self.username
+
+    # An author's most recent posts, used to merge celebrity posts into home feeds;
+    # posts by username for lookups that only have the name
+    __table_args__ = (
+        Index('ix_posts_user_id_id', 'user_id', 'id'),
+        Index('ix_posts_username', 'username'),
+    )
+    __mapper_args__ = {'version_id_col': revision}
 
 class Story(Base):
     __tablename__ = 'stories'
     
     id = Column(Integer, primary_key=True, index=True)
-    image_url = Column(String, index=True)
-    username = Column(String, index=True)
-    
+    image_url = Column(String(255), index=True)
+    username = Column(String(50), index=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True, index=True)
+    created_at = Column(DateTime, nullable=False)
+    # Live stories are read with "expires_at > now" and reaped with "expires_at <= now"
+    expires_at = Column(DateTime, nullable=False, index=True)
+    media_id = Column(Integer, ForeignKey('media.id', ondelete='SET NULL'), nullable=True)
+    revision = Column(Integer, nullable=False, server_default='1')
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow, nullable=False)
+
+    media = relationship('Media', lazy='selectin')
+    author = relationship('User', lazy='selectin')
+
+    __mapper_args__ = {'version_id_col': revision}
+
+    @property
+    def variants(self):
+        return self.media.variants if self.media is not None else []
+
+    @property
+    def author_name(self):
+        return self.author.username if self.author is not None else self.username
+
+class Like(Base):
+    __tablename__ = 'likes'
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    post_id = Column(Integer, ForeignKey('posts.id', ondelete='CASCADE'), nullable=False, index=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    # One like per user and post; also serves "which of these posts did I like"
+    __table_args__ = (
+        Index('ix_likes_user_id_post_id', 'user_id', 'post_id', unique=True),
+    )
+
+class Follow(Base):
+    __tablename__ = 'follows'
+
+    id = Column(Integer, primary_key=True, index=True)
+    follower_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    followee_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    # Unique pair for "who do I follow"; followee index for "who follows this author" at fan-out
+    __table_args__ = (
+        Index('ix_follows_follower_id_followee_id', 'follower_id', 'followee_id', unique=True),
+        Index('ix_follows_followee_id', 'followee_id'),
+    )
+
+class TimelineEntry(Base):
+    __tablename__ = 'timeline_entries'
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    post_id = Column(Integer, ForeignKey('posts.id', ondelete='CASCADE'), nullable=False)
+    author_id = Column(Integer, nullable=False)
+
+    # (user_id, post_id) makes reading a home feed one range scan in post order;
+    # (user_id, author_id) lets an unfollow drop that author's entries
+    __table_args__ = (
+        Index('ix_timeline_entries_user_id_post_id', 'user_id', 'post_id', unique=True),
+        Index('ix_timeline_entries_user_id_author_id', 'user_id', 'author_id'),
+    )
+
+class Media(Base):
+    __tablename__ = 'media'
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), nullable=False)
+    content_type = Column(String(100), nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    variants = relationship('MediaVariant', lazy='selectin', order_by='MediaVariant.width')
+
+    # Content hash lookup for upload dedupe
+    __table_args__ = (
+        Index('ix_media_sha256', 'sha256', unique=True),
+    )
+
+class MediaVariant(Base):
+    __tablename__ = 'media_variants'
+
+    id = Column(Integer, primary_key=True, index=True)
+    media_id = Column(Integer, ForeignKey('media.id', ondelete='CASCADE'), nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    content_type = Column(String(100), nullable=False)
+    size = Column(Integer, nullable=False)
 
-   
\ No newline at end of file
+    __table_args__ = (
+        Index('ix_media_variants_media_id_width', 'media_id', 'width', unique=True),
+    )
@@ -0,0 +1,22 @@
+# Multi-get of rows by primary key for the batch endpoints (/users?ids=1&ids=2).
+# All ids are resolved with one "WHERE id IN (...)" query; the result keeps the
+# order the ids were asked in, with None in the slot of every id that was not
+# found, and lists those ids again under "missing".
+import os
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+MULTI_GET_MAX_IDS = int(os.getenv("MULTI_GET_MAX_IDS", 100))
+
+# Fetch the rows of a model with the given ids, in request order
+async def get_many(db: AsyncSession, model, ids: list[int], query=None) -> dict:
+    query = select(model) if query is None else query
+    wanted = set(ids)
+    found = {}
+    if wanted:
+        result = await db.execute(query.where(model.id.in_(wanted)))
+        found = {row.id: row for row in result.scalars().all()}
+    return {
+        "items": [found.get(row_id) for row_id in ids],
+        "missing": [row_id for row_id in ids if row_id not in found],
+    }
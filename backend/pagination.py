@@ -0,0 +1,52 @@
+# Keyset (cursor) pagination shared by the list endpoints.
+# Rows are returned newest first by primary key; the opaque cursor encodes the
+# last id of the previous page, so each page is an indexed range scan
+# ("WHERE id < :last_id ORDER BY id DESC LIMIT :n") instead of an OFFSET.
+import base64
+import json
+from fastapi import HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Query parameters accepted by every paginated endpoint
+class PageParams:
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: str | None = Query(None),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+# Encode the last id of a page into an opaque cursor
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+# Decode a cursor back into the last id, rejecting anything malformed
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+# Fetch one page of a model, returning the rows and the cursor for the next page
+async def paginate(db: AsyncSession, model, page: PageParams, query=None) -> dict:
+    query = select(model) if query is None else query
+    if page.cursor is not None:
+        query = query.where(model.id < decode_cursor(page.cursor))
+    query = query.order_by(model.id.desc()).limit(page.limit + 1)
+    result = await db.execute(query)
+    rows = result.scalars().all()
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return {"items": rows, "next_cursor": next_cursor}
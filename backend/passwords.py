@@ -0,0 +1,111 @@
+# Password hashing and verification on a dedicated, size-limited process pool.
+# bcrypt is CPU bound; running it on the event loop (or the shared threadpool)
+# lets a burst of logins starve every other route. At most PASSWORD_WORKERS
+# operations run at once, callers queue for a slot and get a 503 once they
+# have waited longer than PASSWORD_MAX_WAIT_SECONDS.
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+import metrics
+
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', str(os.cpu_count() or 2)))
+PASSWORD_MAX_WAIT_SECONDS = float(os.getenv('PASSWORD_MAX_WAIT_SECONDS', '2'))
+
+_pwd_context = None
+_executor = None
+_slots = asyncio.Semaphore(PASSWORD_WORKERS)
+
+_stats = {
+    "queued": 0,
+    "in_flight": 0,
+    "completed": 0,
+    "rejected": 0,
+    "wait_seconds_total": 0.0,
+    "run_seconds_total": 0.0,
+    "run_seconds_max": 0.0,
+}
+
+# Set up the password hashing scheme using bcrypt on first use. Only the worker
+# processes hash passwords, so the web process never imports passlib at all.
+def _get_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+# Worker-side functions, kept at module level so they can be pickled
+def _hash(password: str) -> str:
+    return _get_context().hash(password)
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return _get_context().verify(password, hashed_password)
+
+# Create the process pool on first use. Workers are spawned, not forked: forking
+# a process that already runs the event loop's and database driver's threads can
+# leave a lock held forever in the child.
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+# Run a password function on the pool once a slot frees up, or fail with 503
+async def _run(func, *args):
+    queued_at = time.perf_counter()
+    _stats["queued"] += 1
+    try:
+        await asyncio.wait_for(_slots.acquire(), timeout=PASSWORD_MAX_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        _stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+    finally:
+        _stats["queued"] -= 1
+    started_at = time.perf_counter()
+    _stats["wait_seconds_total"] += started_at - queued_at
+    _stats["in_flight"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), func, *args)
+    finally:
+        _slots.release()
+        elapsed = time.perf_counter() - started_at
+        _stats["in_flight"] -= 1
+        _stats["completed"] += 1
+        _stats["run_seconds_total"] += elapsed
+        _stats["run_seconds_max"] = max(_stats["run_seconds_max"], elapsed)
+
+# Hash a password off the event loop
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password)
+
+# Verify a password against its hash off the event loop
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await _run(_verify, password, hashed_password)
+
+# Stop the worker processes, called on application shutdown
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+@metrics.register
+def collect_password_metrics():
+    return {
+        "password_pool_workers": PASSWORD_WORKERS,
+        "password_queue_depth": _stats["queued"],
+        "password_in_flight": _stats["in_flight"],
+        "password_completed_total": _stats["completed"],
+        "password_rejected_total": _stats["rejected"],
+        "password_wait_seconds_total": round(_stats["wait_seconds_total"], 6),
+        "password_run_seconds_total": round(_stats["run_seconds_total"], 6),
+        "password_run_seconds_max": round(_stats["run_seconds_max"], 6),
+    }
@@ -0,0 +1,142 @@
+# Pydantic models for request bodies and typed responses
+from datetime import datetime
+from typing import Generic, TypeVar
+from pydantic import BaseModel, ConfigDict, Field, computed_field
+from media import MEDIA_BASE_URL
+
+# Define the base model for User-related data (request/response body for registration)
+class UserBase(BaseModel):
+    username: str
+    password: str
+
+# Define the base model for Post-related data (request/response body for posts).
+# There is no likes field: the count is kept by the like endpoints only.
+class PostBase(BaseModel):
+    username: str
+    user_id: int
+    image_url: str
+    description: str
+    media_id: int | None = None
+
+# Define the base model for Story-related data (request/response body for stories)
+class StoryBase(BaseModel):
+    image_url: str
+    username: str
+    media_id: int | None = None
+
+# Model for updating a user's information
+class UserUpdate(BaseModel):
+    username: str
+    password: str
+
+# Model for updating a post
+class PostUpdate(BaseModel):
+    username: str
+    user_id: int
+    image_url: str
+    description: str
+
+# Model for updating a story
+class StoryUpdate(BaseModel):
+    image_url: str
+    hashed_password: str
+
+# Response models read straight from ORM objects. Only the listed fields are
+# serialized, so e.g. hashed_password never leaves the API.
+class UserResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+
+# A resized copy of an uploaded image
+class MediaVariantResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    media_id: int
+    width: int
+    height: int
+    content_type: str
+
+    @computed_field
+    @property
+    def url(self) -> str:
+        return f"{MEDIA_BASE_URL}/media/{self.media_id}/variants/{self.width}"
+
+# username is the author's current name, read through the author relationship
+class PostResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str | None = Field(validation_alias="author_name")
+    user_id: int | None
+    image_url: str | None
+    description: str | None
+    likes: int | None
+    media_id: int | None = None
+    variants: list[MediaVariantResponse] = []
+
+class StoryResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    image_url: str | None
+    username: str | None = Field(validation_alias="author_name")
+    user_id: int | None = None
+    created_at: datetime
+    expires_at: datetime
+    media_id: int | None = None
+    variants: list[MediaVariantResponse] = []
+
+# Like state and count returned by the like/unlike endpoints
+class LikeResponse(BaseModel):
+    post_id: int
+    liked: bool
+    likes: int
+
+# Which of the requested posts the current user has liked
+class LikedPostsResponse(BaseModel):
+    liked_post_ids: list[int]
+
+# Whether a username can still be registered
+class UsernameAvailabilityResponse(BaseModel):
+    username: str
+    available: bool
+
+# Follow state returned by the follow/unfollow endpoints
+class FollowResponse(BaseModel):
+    user_id: int
+    following: bool
+
+# One author's live stories in the story tray, newest first, under the
+# author's current name
+class StoryTrayAuthor(BaseModel):
+    user_id: int | None
+    username: str | None
+    latest_story_at: datetime
+    stories: list[StoryResponse]
+
+class StoryTrayResponse(BaseModel):
+    authors: list[StoryTrayAuthor]
+
+# Stored upload; url can be used as a post's or story's image_url
+class MediaResponse(BaseModel):
+    id: int
+    url: str
+    sha256: str
+    content_type: str
+    size: int
+    deduplicated: bool
+
+T = TypeVar("T")
+
+# One page of a keyset-paginated list endpoint
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: str | None = None
+
+# Rows of a multi-get endpoint in the order their ids were asked for, with null
+# for ids that do not exist; those ids are also listed under "missing"
+class Batch(BaseModel, Generic[T]):
+    items: list[T | None]
+    missing: list[int]
@@ -0,0 +1,167 @@
+# Story lifetimes and the background reaper for expired stories.
+# Every story gets an expires_at STORY_TTL_HOURS after creation; reads filter on
+# the indexed expires_at column, and a background task deletes expired rows in
+# batches of STORY_REAP_BATCH_SIZE, committing after each batch so it never
+# holds long locks on the stories table.
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import metrics
+import models
+from cache import response_cache
+from models import utcnow
+
+logger = logging.getLogger(__name__)
+
+STORY_TTL_HOURS = float(os.getenv('STORY_TTL_HOURS', '24'))
+STORY_REAP_INTERVAL_SECONDS = float(os.getenv('STORY_REAP_INTERVAL_SECONDS', '60'))
+STORY_REAP_BATCH_SIZE = int(os.getenv('STORY_REAP_BATCH_SIZE', '500'))
+# How long clients and the response cache may reuse a story tray response
+STORY_TRAY_TTL_SECONDS = int(os.getenv('STORY_TRAY_TTL_SECONDS', '30'))
+# The tray shows the most recently active authors, each with their newest stories
+STORY_TRAY_MAX_AUTHORS = int(os.getenv('STORY_TRAY_MAX_AUTHORS', '50'))
+STORY_TRAY_STORIES_PER_AUTHOR = int(os.getenv('STORY_TRAY_STORIES_PER_AUTHOR', '20'))
+
+# Expiry time for a story created now
+def expiry_from_now() -> datetime:
+    return utcnow() + timedelta(hours=STORY_TTL_HOURS)
+
+# How long a response showing the given stories may be cached: at most ttl, and
+# never past the first of them expiring
+def cache_ttl(rows, ttl: float) -> float:
+    now = utcnow()
+    return min([ttl, *((row.expires_at - now).total_seconds() for row in rows)])
+
+# Query for stories that have not expired yet
+def live_stories_query():
+    return select(models.Story).where(models.Story.expires_at > utcnow())
+
+# Live stories grouped by author for the story tray, in one query. Window
+# functions give each row its author's latest story time and its place among
+# the author's stories, then rank authors by recency, so only the newest
+# STORY_TRAY_STORIES_PER_AUTHOR stories of the STORY_TRAY_MAX_AUTHORS most
+# recent authors are loaded. Authors are told apart by user_id, and stories
+# without one by the name they were posted with; each group is labelled with
+# the author's current name. Rows arrive ordered by author recency and then
+# story recency and are grouped in a single pass.
+async def story_tray(db: AsyncSession) -> list[dict]:
+    story = models.Story
+    legacy_name = case((story.user_id.is_(None), story.username))
+    author = (story.user_id, legacy_name)
+    live = (
+        select(
+            story.id, story.user_id, legacy_name.label("legacy_name"),
+            func.max(story.created_at).over(partition_by=author).label("latest_story_at"),
+            func.row_number().over(
+                partition_by=author, order_by=(story.created_at.desc(), story.id.desc()),
+            ).label("position"),
+        )
+        .where(story.expires_at > utcnow())
+        .subquery()
+    )
+    ranked = select(
+        live,
+        func.dense_rank().over(
+            order_by=(live.c.latest_story_at.desc(), live.c.user_id, live.c.legacy_name),
+        ).label("author_rank"),
+    ).subquery()
+    result = await db.execute(
+        select(story, ranked.c.author_rank, ranked.c.latest_story_at)
+        .join(ranked, ranked.c.id == story.id)
+        .where(ranked.c.position <= STORY_TRAY_STORIES_PER_AUTHOR, ranked.c.author_rank <= STORY_TRAY_MAX_AUTHORS)
+        .order_by(ranked.c.author_rank, story.created_at.desc(), story.id.desc())
+    )
+    authors, rank = [], None
+    for row, author_rank, latest_story_at in result.all():
+        if author_rank != rank:
+            rank = author_rank
+            authors.append({
+                "user_id": row.user_id, "username": row.author_name,
+                "latest_story_at": latest_story_at, "stories": [],
+            })
+        authors[-1]["stories"].append(row)
+    return authors
+
+# Delete one batch of expired stories, returning how many rows were removed
+async def reap_batch(db: AsyncSession, batch_size: int) -> int:
+    result = await db.execute(
+        select(models.Story.id)
+        .where(models.Story.expires_at <= utcnow())
+        .order_by(models.Story.expires_at)
+        .limit(batch_size)
+    )
+    story_ids = result.scalars().all()
+    if story_ids:
+        await db.execute(
+            delete(models.Story)
+            .where(models.Story.id.in_(story_ids))
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    response_cache.invalidate(*(f"story:{story_id}" for story_id in story_ids))
+    return len(story_ids)
+
+# Periodically deletes expired stories in small batches
+class StoryReaper:
+    def __init__(self, session_factory, interval: float, batch_size: int):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+        self.reaped = 0
+        self.errors = 0
+
+    # Reap batches until a short one shows nothing expired is left
+    async def reap(self):
+        async with self.session_factory() as db:
+            while True:
+                count = await reap_batch(db, self.batch_size)
+                self.reaped += count
+                if count < self.batch_size:
+                    return
+                # Let request handlers run between batches
+                await asyncio.sleep(0)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.reap()
+            except Exception:
+                logger.exception("Reaping expired stories failed")
+                self.errors += 1
+            await asyncio.sleep(self.interval)
+
+    # Start the reaper, called on application startup
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # Stop the reaper, called on application shutdown
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+reaper = None
+
+# Create the process-wide reaper bound to the primary session factory
+def init_reaper(session_factory) -> StoryReaper:
+    global reaper
+    reaper = StoryReaper(session_factory, STORY_REAP_INTERVAL_SECONDS, STORY_REAP_BATCH_SIZE)
+    return reaper
+
+@metrics.register
+def collect_story_metrics():
+    if reaper is None:
+        return {}
+    return {
+        "stories_reaped_total": reaper.reaped,
+        "stories_reap_errors_total": reaper.errors,
+    }
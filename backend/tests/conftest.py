@@ -0,0 +1,48 @@
+# Shared fixtures: a fresh SQLite database per test, created through the
+# migrations like a real one. Tests drive async code with asyncio.run.
+import asyncio
+import os
+import tempfile
+import pytest
+
+# The app builds its engines at import time; point them at a throwaway file
+APP_DB_PATH = os.path.join(tempfile.mkdtemp(), "app.db")
+os.environ["URL_DATABASE"] = f"sqlite+aiosqlite:///{APP_DB_PATH}"
+os.environ["URL_DATABASE_REPLICAS"] = ""
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+import database
+import migrations
+
+@pytest.fixture
+def engine(tmp_path):
+    # NullPool: every asyncio.run gets its own connections
+    engine = database.enable_sqlite_foreign_keys(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=NullPool)
+    )
+    asyncio.run(migrations.upgrade(engine))
+    yield engine
+    asyncio.run(engine.dispose())
+
+@pytest.fixture
+def session_factory(engine):
+    return database.build_sessionmaker(engine)
+
+# The whole app on a freshly migrated database, with its process-wide caches emptied
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    import auth
+    import main
+    import cache
+    from user_cache import user_cache
+
+    asyncio.run(migrations.upgrade(database.engine))
+    asyncio.run(database.engine.dispose())
+    cache.response_cache.backend = cache.LRUCacheBackend(cache.RESPONSE_CACHE_MAX_ENTRIES)
+    user_cache.clear()
+    auth.token_cache.clear()
+    with TestClient(main.app) as client:
+        yield client
+    os.remove(APP_DB_PATH)
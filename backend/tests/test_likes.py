@@ -0,0 +1,97 @@
+import asyncio
+import likes
+import models
+
+def add_post(session_factory) -> int:
+    async def run():
+        async with session_factory() as db:
+            post = models.Post(username="ann", description="", image_url="", likes=0)
+            db.add(post)
+            await db.commit()
+            return post.id
+    return asyncio.run(run())
+
+def stored_likes(session_factory, post_id: int) -> int:
+    async def run():
+        async with session_factory() as db:
+            return (await db.get(models.Post, post_id)).likes
+    return asyncio.run(run())
+
+# Replace apply_like_deltas with one that waits for a gate, to hold a flush open
+def gated_apply(monkeypatch):
+    entered, gate = asyncio.Event(), asyncio.Event()
+    real_apply = likes.apply_like_deltas
+    async def apply(db, deltas):
+        entered.set()
+        await gate.wait()
+        await real_apply(db, deltas)
+    monkeypatch.setattr(likes, "apply_like_deltas", apply)
+    return entered, gate
+
+def test_set_liked_without_aggregator_is_idempotent(session_factory):
+    post_id = add_post(session_factory)
+    async def run():
+        async with session_factory() as db:
+            first = await likes.set_liked(db, 1, post_id, True)
+            again = await likes.set_liked(db, 1, post_id, True)
+            removed = await likes.set_liked(db, 1, post_id, False)
+            missing = await likes.set_liked(db, 1, post_id + 1, True)
+            return first, again, removed, missing
+    assert asyncio.run(run()) == (1, 1, 0, None)
+    assert stored_likes(session_factory, post_id) == 0
+
+def test_count_includes_deltas_of_a_flush_in_progress(session_factory, monkeypatch):
+    post_id = add_post(session_factory)
+    async def run():
+        aggregator = likes.LikeAggregator(session_factory, 60000, 1000)
+        monkeypatch.setattr(likes, "aggregator", aggregator)
+        entered, gate = gated_apply(monkeypatch)
+        async with session_factory() as db:
+            await likes.set_liked(db, 1, post_id, True)
+        flush = asyncio.create_task(aggregator.flush())
+        await entered.wait()
+        assert aggregator.pending_delta(post_id) == 1
+        async with session_factory() as db:
+            counting = asyncio.create_task(likes.set_liked(db, 2, post_id, True))
+            await asyncio.sleep(0.05)
+            gate.set()
+            await flush
+            return await counting
+    assert asyncio.run(run()) == 2
+    assert stored_likes(session_factory, post_id) == 1
+
+def test_cancelled_flush_keeps_its_deltas(session_factory, monkeypatch):
+    post_id = add_post(session_factory)
+    async def run():
+        aggregator = likes.LikeAggregator(session_factory, 60000, 1000)
+        entered, gate = gated_apply(monkeypatch)
+        aggregator.add(post_id, 1)
+        aggregator.add(post_id, 1)
+        flush = asyncio.create_task(aggregator.flush())
+        await entered.wait()
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+        assert aggregator.pending_delta(post_id) == 2
+        assert aggregator.pending_events == 2
+        gate.set()
+        await aggregator.flush()
+        assert aggregator.pending_delta(post_id) == 0
+    asyncio.run(run())
+    assert stored_likes(session_factory, post_id) == 2
+
+def test_stop_lets_a_running_flush_finish(session_factory, monkeypatch):
+    post_id = add_post(session_factory)
+    async def run():
+        aggregator = likes.LikeAggregator(session_factory, 10, 1000)
+        entered, gate = gated_apply(monkeypatch)
+        aggregator.start()
+        aggregator.add(post_id, 1)
+        await entered.wait()
+        aggregator.add(post_id, 1)
+        stopping = asyncio.create_task(aggregator.stop())
+        await asyncio.sleep(0.05)
+        gate.set()
+        await stopping
+        assert aggregator.pending_delta(post_id) == 0
+    asyncio.run(run())
+    assert stored_likes(session_factory, post_id) == 2
@@ -0,0 +1,38 @@
+import asyncio
+import os
+import database
+import media
+import models
+import thumbnails
+
+def upload(client, data: bytes) -> int:
+    response = client.post("/media", files={"file": ("clip.mp4", data, "video/mp4")})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+def add_variant(media_id: int, sha256: str, width: int, data: bytes):
+    async def run():
+        async with database.build_sessionmaker(database.engine)() as db:
+            db.add(models.MediaVariant(media_id=media_id, width=width, height=width, content_type="image/webp", size=len(data)))
+            await db.commit()
+        await database.engine.dispose()
+    asyncio.run(run())
+    with open(thumbnails.variant_path(sha256, width), "wb") as file:
+        file.write(data)
+
+def test_head_returns_headers_without_body(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(media, "MEDIA_ROOT", str(tmp_path))
+    media_id = upload(client, b"0123456789")
+    got = client.get(f"/media/{media_id}")
+    head = client.head(f"/media/{media_id}")
+    assert head.status_code == 200
+    assert head.content == b""
+    assert head.headers["content-length"] == "10"
+    assert head.headers["etag"] == got.headers["etag"]
+
+    add_variant(media_id, got.headers["etag"].strip('"'), 320, b"small")
+    head = client.head(f"/media/{media_id}/variants/320")
+    assert head.status_code == 200
+    assert head.content == b""
+    assert head.headers["content-length"] == "5"
+    assert client.head(f"/media/{media_id}/variants/640").status_code == 404
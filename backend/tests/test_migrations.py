@@ -0,0 +1,59 @@
+import asyncio
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+import migrations
+import models
+
+def schema(engine) -> dict:
+    def read(conn):
+        inspector = inspect(conn)
+        return {
+            table: (
+                {column["name"] for column in inspector.get_columns(table)},
+                {index["name"] for index in inspector.get_indexes(table)},
+                {(tuple(fk["constrained_columns"]), fk["referred_table"]) for fk in inspector.get_foreign_keys(table)},
+            )
+            for table in inspector.get_table_names() if table != migrations.version_table.name
+        }
+    async def run():
+        async with engine.connect() as conn:
+            return await conn.run_sync(read)
+    return asyncio.run(run())
+
+# A model change without a migration shows up here as a mismatch
+def test_migrated_schema_matches_the_models(engine):
+    expected = {
+        table.name: (
+            {column.name for column in table.columns},
+            {index.name for index in table.indexes},
+            {((fk.parent.name,), fk.column.table.name) for fk in table.foreign_keys},
+        )
+        for table in models.Base.metadata.sorted_tables
+    }
+    assert schema(engine) == expected
+
+def test_upgrade_brings_a_first_release_database_to_head(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}", poolclass=NullPool)
+    async def run():
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50) UNIQUE, hashed_password VARCHAR(50))"))
+            await conn.execute(text("CREATE TABLE posts (id INTEGER PRIMARY KEY, username VARCHAR, user_id INTEGER, image_url VARCHAR(255), description VARCHAR(100), likes INTEGER)"))
+            await conn.execute(text("CREATE TABLE stories (id INTEGER PRIMARY KEY, image_url VARCHAR, username VARCHAR)"))
+            await conn.execute(text("INSERT INTO users (id, username) VALUES (1, 'ann')"))
+            await conn.execute(text("INSERT INTO posts (id, username, user_id, likes) VALUES (1, 'ann', 1, 3), (2, 'bob', 9, 0)"))
+        applied = await migrations.upgrade(engine)
+        again = await migrations.upgrade(engine)
+        async with engine.connect() as conn:
+            posts = (await conn.execute(text("SELECT id, user_id, likes, revision FROM posts ORDER BY id"))).all()
+        return applied, again, posts
+    applied, again, posts = asyncio.run(run())
+    assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+    assert again == []
+    # The post by a missing user loses its dangling author
+    assert posts == [(1, 1, 3, 1), (2, None, 0, 1)]
+    tables = schema(engine)
+    for table in models.Base.metadata.sorted_tables:
+        assert {column.name for column in table.columns} <= tables[table.name][0]
+    assert {"ix_posts_user_id_id", "ix_stories_expires_at", "ix_stories_user_id"} <= tables["posts"][1] | tables["stories"][1]
+    asyncio.run(engine.dispose())
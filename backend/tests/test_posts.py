@@ -0,0 +1,21 @@
+def create_post(client, **fields) -> dict:
+    body = {"username": "ann", "user_id": 1, "image_url": "a.jpg", "description": "hi", **fields}
+    assert client.post("/posts/", json=body).status_code == 201
+    return client.get("/posts/").json()["items"][0]
+
+def test_clients_cannot_set_like_counts(client):
+    client.post("/register/", json={"username": "ann", "password": "pw"})
+    post = create_post(client, likes=100)
+    assert post["likes"] == 0
+    body = {"username": "ann", "user_id": 1, "image_url": "a.jpg", "description": "edited", "likes": 5}
+    updated = client.put(f"/posts/{post['id']}", json=body).json()
+    assert updated["description"] == "edited"
+    assert updated["likes"] == 0
+
+def test_update_shows_the_new_authors_name(client):
+    client.post("/register/", json={"username": "ann", "password": "pw"})
+    client.post("/register/", json={"username": "bob", "password": "pw"})
+    post = create_post(client)
+    body = {"username": "bob", "user_id": 2, "image_url": "a.jpg", "description": "hi"}
+    assert client.put(f"/posts/{post['id']}", json=body).json()["username"] == "bob"
+    assert client.get(f"/posts/{post['id']}").json()["username"] == "bob"
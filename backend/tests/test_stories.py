@@ -0,0 +1,79 @@
+import asyncio
+import time
+from datetime import timedelta
+import cache
+import models
+import stories
+
+def add_stories(session_factory, *authors: str):
+    async def run():
+        now = stories.utcnow()
+        async with session_factory() as db:
+            for minutes, username in enumerate(authors):
+                created_at = now - timedelta(minutes=len(authors) - minutes)
+                db.add(models.Story(
+                    username=username, image_url="a.jpg", created_at=created_at,
+                    expires_at=created_at + timedelta(hours=1),
+                ))
+            await db.commit()
+    asyncio.run(run())
+
+def tray(session_factory) -> list[tuple[str, int]]:
+    async def run():
+        async with session_factory() as db:
+            return [(author["username"], len(author["stories"])) for author in await stories.story_tray(db)]
+    return asyncio.run(run())
+
+def test_tray_is_bounded_by_authors_and_stories_per_author(session_factory, monkeypatch):
+    monkeypatch.setattr(stories, "STORY_TRAY_MAX_AUTHORS", 2)
+    monkeypatch.setattr(stories, "STORY_TRAY_STORIES_PER_AUTHOR", 2)
+    add_stories(session_factory, "cat", "ann", "ann", "bob", "ann", "bob")
+    assert tray(session_factory) == [("bob", 2), ("ann", 2)]
+
+def test_tray_is_cached_for_every_viewer(client):
+    client.post("/stories/", json={"username": "ann", "image_url": "a.jpg"})
+    client.cookies.clear()
+    first = client.get("/stories/tray")
+    assert [author["username"] for author in first.json()["authors"]] == ["ann"]
+    assert "Vary" not in first.headers
+    assert first.headers["Cache-Control"] == f"max-age={stories.STORY_TRAY_TTL_SECONDS}"
+    hits = cache.response_cache.hits
+    again = client.get("/stories/tray", headers={"Authorization": "Bearer other"})
+    assert again.content == first.content
+    assert cache.response_cache.hits == hits + 1
+    assert client.get("/stories/tray", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    client.post("/stories/", json={"username": "bob", "image_url": "b.jpg"})
+    assert [author["username"] for author in client.get("/stories/tray").json()["authors"]] == ["bob", "ann"]
+
+def test_cached_story_is_gone_once_it_expires(client, monkeypatch):
+    monkeypatch.setattr(stories, "STORY_TTL_HOURS", 0.5 / 3600)
+    story = client.post("/stories/", json={"username": "ann", "image_url": "a.jpg"}).json()
+    # Drop the read-your-writes cookie so the reads go through the cache
+    client.cookies.clear()
+    assert client.get(f"/stories/{story['id']}").status_code == 200
+    assert client.get("/stories/tray").json()["authors"]
+    time.sleep(0.6)
+    assert client.get(f"/stories/{story['id']}").status_code == 404
+    assert client.get("/stories/tray").json()["authors"] == []
+
+def test_tray_groups_by_author_under_their_current_name(session_factory):
+    async def run():
+        now = stories.utcnow()
+        async with session_factory() as db:
+            user = models.User(username="ann")
+            db.add(user)
+            await db.flush()
+            for minutes, (username, user_id) in enumerate([("ann", user.id), ("anna", None), ("ann", user.id)]):
+                created_at = now - timedelta(minutes=3 - minutes)
+                db.add(models.Story(
+                    username=username, user_id=user_id, image_url="a.jpg",
+                    created_at=created_at, expires_at=created_at + timedelta(hours=1),
+                ))
+            user.username = "anna"
+            await db.commit()
+        async with session_factory() as db:
+            return [
+                (author["user_id"], author["username"], len(author["stories"]))
+                for author in await stories.story_tray(db)
+            ]
+    assert asyncio.run(run()) == [(1, "anna", 2), (None, "anna", 1)]
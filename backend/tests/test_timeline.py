@@ -0,0 +1,32 @@
+import asyncio
+import models
+import timeline
+from pagination import PageParams
+
+def page(limit=20):
+    return PageParams(limit=limit, cursor=None)
+
+def test_posts_from_a_celebrity_period_reach_feeds_after_dropping_below(session_factory, monkeypatch):
+    monkeypatch.setattr(timeline, "CELEBRITY_FOLLOWER_THRESHOLD", 2)
+    async def run():
+        async with session_factory() as db:
+            db.add_all([models.User(id=i, username=f"user{i}", hashed_password="x") for i in (1, 2, 3)])
+            await db.commit()
+            for follower_id in (2, 3):
+                assert await timeline.follow(db, follower_id, 1)
+            post = models.Post(username="user1", user_id=1, likes=0)
+            db.add(post)
+            await db.commit()
+        # Celebrity: only the author's own timeline gets the post, followers merge it on read
+        await timeline.fan_out_post(session_factory, post.id, 1)
+        async with session_factory() as db:
+            feed = await timeline.home_timeline_page(db, 2, page())
+            assert [row.id for row in feed["items"]] == [post.id]
+            followers = await timeline.unfollow(db, 3, 1)
+        assert timeline.dropped_below_threshold(followers)
+        await timeline.backfill_followers(session_factory, 1)
+        async with session_factory() as db:
+            feed = await timeline.home_timeline_page(db, 2, page())
+            assert [row.id for row in feed["items"]] == [post.id]
+            assert await timeline.unfollow(db, 3, 1) is None
+    asyncio.run(run())
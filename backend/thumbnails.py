@@ -0,0 +1,90 @@
+# Background generation of resized image variants on a process pool.
+# Uploaded images are decoded once per variant width in a worker process: EXIF
+# orientation is applied, metadata is dropped and each width is saved as WebP.
+# Uploads enqueue this after responding, so resizing never runs on the request path.
+import asyncio
+import multiprocessing
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import insert, select
+import media
+import models
+
+logger = logging.getLogger(__name__)
+
+MEDIA_WORKERS = int(os.getenv('MEDIA_WORKERS', '2'))
+VARIANT_WIDTHS = [int(width) for width in os.getenv('VARIANT_WIDTHS', '150,320,640,1080').split(',')]
+VARIANT_QUALITY = int(os.getenv('VARIANT_QUALITY', '80'))
+VARIANT_CONTENT_TYPE = 'image/webp'
+# Still images only; animated GIFs and video are served as uploaded
+RESIZABLE_TYPES = {'image/jpeg', 'image/png', 'image/webp'}
+
+_executor = None
+
+# Where a variant lives on disk, next to the original
+def variant_path(sha256: str, width: int) -> str:
+    return f"{media.media_path(sha256)}_{width}.webp"
+
+# Worker-side: write every variant narrower than the original, returning their sizes.
+# Pillow is imported here so only the worker processes load it.
+def _render_variants(source_path: str, sha256: str, widths: list[int], quality: int) -> list[dict]:
+    from PIL import Image, ImageOps
+
+    rendered = []
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        for width in sorted(set(widths)):
+            if width >= image.width:
+                continue
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            path = variant_path(sha256, width)
+            # Saved without exif or icc data, so camera metadata is stripped
+            resized.save(path, 'WEBP', quality=quality, method=4)
+            rendered.append({"width": width, "height": height, "size": os.path.getsize(path)})
+    return rendered
+
+# Create the process pool on first use; spawned like the password workers, since
+# forking a multi-threaded process can deadlock the child
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MEDIA_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+# Background task: render the variants of a new upload and record them
+async def generate_variants(session_factory, media_id: int):
+    async with session_factory() as db:
+        db_media = await db.get(models.Media, media_id)
+        if db_media is None or db_media.content_type not in RESIZABLE_TYPES:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            rendered = await loop.run_in_executor(
+                _get_executor(), _render_variants,
+                media.media_path(db_media.sha256), db_media.sha256, VARIANT_WIDTHS, VARIANT_QUALITY,
+            )
+        except Exception:
+            logger.exception("Generating variants for media %d failed", media_id)
+            return
+        existing = await db.execute(
+            select(models.MediaVariant.width).where(models.MediaVariant.media_id == media_id)
+        )
+        known = set(existing.scalars().all())
+        rows = [
+            {"media_id": media_id, "content_type": VARIANT_CONTENT_TYPE, **variant}
+            for variant in rendered if variant["width"] not in known
+        ]
+        if rows:
+            await db.execute(insert(models.MediaVariant), rows)
+            await db.commit()
+
+# Stop the worker processes, called on application shutdown
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,219 @@
+# Follow graph and precomputed home timelines (hybrid fan-out).
+# When a post is created its id is pushed into the timeline of the author and of
+# every follower by a background task, so reading a home feed is a single range
+# scan over timeline_entries(user_id, post_id) instead of a join across every
+# followed author at read time.
+# Authors with at least CELEBRITY_FOLLOWER_THRESHOLD followers are not fanned out;
+# their recent posts are merged into the precomputed page at read time with a
+# k-way heap merge, which keeps write amplification bounded. When an author drops
+# back below the threshold their recent posts are copied into every follower's
+# timeline, since they are no longer merged at read time.
+import heapq
+import os
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from pagination import PageParams, decode_cursor, encode_cursor
+
+FANOUT_BATCH_SIZE = int(os.getenv('FANOUT_BATCH_SIZE', '1000'))
+CELEBRITY_FOLLOWER_THRESHOLD = int(os.getenv('CELEBRITY_FOLLOWER_THRESHOLD', '10000'))
+# How many of an author's recent posts are copied into a new follower's timeline
+FOLLOW_BACKFILL_POSTS = int(os.getenv('FOLLOW_BACKFILL_POSTS', '50'))
+
+# Insert timeline rows, skipping any (user_id, post_id) that already exists
+async def _insert_entries(db: AsyncSession, rows: list[dict]):
+    if not rows:
+        return
+    statement = insert(models.TimelineEntry)
+    dialect = db.get_bind().dialect.name
+    if dialect == 'mysql':
+        statement = statement.prefix_with('IGNORE')
+    elif dialect == 'sqlite':
+        statement = statement.prefix_with('OR IGNORE')
+    await db.execute(statement, rows)
+
+# Add delta to a user's follower count
+async def _change_follower_count(db: AsyncSession, user_id: int, delta: int):
+    await db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(follower_count=models.User.follower_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+# Whether an author has enough followers to skip fan-out
+async def is_celebrity(db: AsyncSession, author_id: int) -> bool:
+    count = await db.scalar(select(models.User.follower_count).where(models.User.id == author_id))
+    return (count or 0) >= CELEBRITY_FOLLOWER_THRESHOLD
+
+# Follow an author; returns False if already following
+async def follow(db: AsyncSession, follower_id: int, followee_id: int) -> bool:
+    try:
+        async with db.begin_nested():
+            db.add(models.Follow(follower_id=follower_id, followee_id=followee_id))
+    except IntegrityError:
+        return False
+    await _change_follower_count(db, followee_id, 1)
+    await db.commit()
+    return True
+
+# Unfollow an author and drop their posts from the follower's timeline. Returns the
+# author's follower count afterwards, read in the same transaction as the change,
+# or None if the follower was not following them.
+async def unfollow(db: AsyncSession, follower_id: int, followee_id: int) -> int | None:
+    result = await db.execute(
+        delete(models.Follow).where(
+            models.Follow.follower_id == follower_id, models.Follow.followee_id == followee_id
+        )
+    )
+    if result.rowcount == 0:
+        return None
+    await _change_follower_count(db, followee_id, -1)
+    followers = await db.scalar(select(models.User.follower_count).where(models.User.id == followee_id))
+    await db.execute(
+        delete(models.TimelineEntry).where(
+            models.TimelineEntry.user_id == follower_id, models.TimelineEntry.author_id == followee_id
+        )
+    )
+    await db.commit()
+    return followers
+
+# Whether an unfollow leaving an author with this many followers took them below the threshold
+def dropped_below_threshold(followers: int | None) -> bool:
+    return followers == CELEBRITY_FOLLOWER_THRESHOLD - 1
+
+# Background task: push a new post into the author's and every follower's timeline,
+# reading followers and writing entries in batches of FANOUT_BATCH_SIZE.
+# Celebrity posts only go into the author's own timeline.
+async def fan_out_post(session_factory, post_id: int, author_id: int):
+    async with session_factory() as db:
+        await _insert_entries(db, [{"user_id": author_id, "post_id": post_id, "author_id": author_id}])
+        if await is_celebrity(db, author_id):
+            await db.commit()
+            return
+        last_follower_id = 0
+        while True:
+            result = await db.execute(
+                select(models.Follow.follower_id)
+                .where(models.Follow.followee_id == author_id, models.Follow.follower_id > last_follower_id)
+                .order_by(models.Follow.follower_id)
+                .limit(FANOUT_BATCH_SIZE)
+            )
+            follower_ids = result.scalars().all()
+            if not follower_ids:
+                break
+            await _insert_entries(db, [
+                {"user_id": follower_id, "post_id": post_id, "author_id": author_id}
+                for follower_id in follower_ids
+            ])
+            await db.commit()
+            last_follower_id = follower_ids[-1]
+        await db.commit()
+
+# Background task: copy an author's recent posts into a new follower's timeline.
+# Celebrity posts are merged at read time, so there is nothing to copy for them.
+async def backfill_follow(session_factory, follower_id: int, followee_id: int):
+    async with session_factory() as db:
+        if await is_celebrity(db, followee_id):
+            return
+        result = await db.execute(
+            select(models.Post.id)
+            .where(models.Post.user_id == followee_id)
+            .order_by(models.Post.id.desc())
+            .limit(FOLLOW_BACKFILL_POSTS)
+        )
+        await _insert_entries(db, [
+            {"user_id": follower_id, "post_id": post_id, "author_id": followee_id}
+            for post_id in result.scalars().all()
+        ])
+        await db.commit()
+
+# Background task: copy the recent posts of an author who dropped below the
+# celebrity threshold into every follower's timeline. Posts made while they were
+# above it were never fanned out and are no longer merged at read time.
+async def backfill_followers(session_factory, author_id: int):
+    async with session_factory() as db:
+        # Back above the threshold by now: their posts are merged at read time again
+        if await is_celebrity(db, author_id):
+            return
+        result = await db.execute(
+            select(models.Post.id)
+            .where(models.Post.user_id == author_id)
+            .order_by(models.Post.id.desc())
+            .limit(FOLLOW_BACKFILL_POSTS)
+        )
+        post_ids = result.scalars().all()
+        if not post_ids:
+            return
+        # Keep each insert at about FANOUT_BATCH_SIZE rows
+        batch_size = max(1, FANOUT_BATCH_SIZE // len(post_ids))
+        last_follower_id = 0
+        while True:
+            result = await db.execute(
+                select(models.Follow.follower_id)
+                .where(models.Follow.followee_id == author_id, models.Follow.follower_id > last_follower_id)
+                .order_by(models.Follow.follower_id)
+                .limit(batch_size)
+            )
+            follower_ids = result.scalars().all()
+            if not follower_ids:
+                return
+            await _insert_entries(db, [
+                {"user_id": follower_id, "post_id": post_id, "author_id": author_id}
+                for follower_id in follower_ids
+                for post_id in post_ids
+            ])
+            await db.commit()
+            last_follower_id = follower_ids[-1]
+
+# Query for a user's precomputed home timeline
+def home_timeline_query(user_id: int):
+    return (
+        select(models.Post)
+        .join(models.TimelineEntry, models.TimelineEntry.post_id == models.Post.id)
+        .where(models.TimelineEntry.user_id == user_id)
+    )
+
+# One page of a user's home feed: the precomputed timeline merged with the recent
+# posts of every followed celebrity. Each source is a newest-first range scan of at
+# most limit + 1 rows; heapq.merge interleaves them by post id.
+async def home_timeline_page(db: AsyncSession, user_id: int, page: PageParams) -> dict:
+    last_id = decode_cursor(page.cursor) if page.cursor is not None else None
+    fetch = page.limit + 1
+
+    precomputed = home_timeline_query(user_id)
+    if last_id is not None:
+        precomputed = precomputed.where(models.TimelineEntry.post_id < last_id)
+    precomputed = precomputed.order_by(models.TimelineEntry.post_id.desc()).limit(fetch)
+    streams = [(await db.execute(precomputed)).scalars().all()]
+
+    celebrities = await db.execute(
+        select(models.Follow.followee_id)
+        .join(models.User, models.User.id == models.Follow.followee_id)
+        .where(
+            models.Follow.follower_id == user_id,
+            models.User.follower_count >= CELEBRITY_FOLLOWER_THRESHOLD,
+        )
+    )
+    for author_id in celebrities.scalars().all():
+        recent = select(models.Post).where(models.Post.user_id == author_id)
+        if last_id is not None:
+            recent = recent.where(models.Post.id < last_id)
+        recent = recent.order_by(models.Post.id.desc()).limit(fetch)
+        streams.append((await db.execute(recent)).scalars().all())
+
+    # A post can be in several streams if its author crossed the threshold after it was fanned out
+    rows, seen = [], set()
+    for post in heapq.merge(*streams, key=lambda post: post.id, reverse=True):
+        if post.id in seen:
+            continue
+        seen.add(post.id)
+        rows.append(post)
+        if len(rows) == fetch:
+            break
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return {"items": rows, "next_cursor": next_cursor}
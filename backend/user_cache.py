@@ -0,0 +1,86 @@
+# In-process cache of username -> user row for login, registration and token
+# fallbacks. Only the columns those paths need (id, username, password hash) are
+# kept, detached from any session, so a hit needs neither a query nor a
+# connection. Usernames that do not exist are cached too, for a shorter time, so
+# repeated bad logins and probes for a free name are answered without a query.
+# Entries live for USER_CACHE_TTL_SECONDS; this process drops them as soon as
+# it creates, renames or deletes the user, other workers within the TTL.
+import os
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+import metrics
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+# Kept short: a name registered through another worker reads as free until then
+USER_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("USER_CACHE_NEGATIVE_TTL_SECONDS", "5"))
+
+# Returned by UserCache.get when the username is not cached either way
+MISS = object()
+
+class CachedUser(NamedTuple):
+    id: int
+    username: str
+    hashed_password: str | None
+
+# Bounded LRU mapping usernames to their user, or to None if there is no such user
+class UserCache:
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    # Return the cached user, None for a known missing username, or MISS
+    def get(self, username: str):
+        entry = self._entries.get(username)
+        if entry is None:
+            self.misses += 1
+            return MISS
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            del self._entries[username]
+            self.misses += 1
+            return MISS
+        self._entries.move_to_end(username)
+        if user is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return user
+
+    # Cache a lookup result, evicting the least recently used entries
+    def put(self, username: str, user: CachedUser | None):
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if user is not None else self.negative_ttl
+        self._entries[username] = (time.monotonic() + ttl, user)
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    # Forget usernames whose row was created, renamed or deleted
+    def invalidate(self, *usernames: str):
+        for username in usernames:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS, USER_CACHE_NEGATIVE_TTL_SECONDS)
+
+@metrics.register
+def collect_user_cache_metrics():
+    return {
+        "user_cache_entries": len(user_cache),
+        "user_cache_hits_total": user_cache.hits,
+        "user_cache_negative_hits_total": user_cache.negative_hits,
+        "user_cache_misses_total": user_cache.misses,
+    }
@@ -0,0 +1,199 @@
+# Bloom filter of existing usernames for registration and availability checks.
+# A negative answer means the name is certainly not taken, so the database
+# lookup is skipped entirely; a positive answer (taken, or a false positive at
+# roughly USERNAME_FILTER_FALSE_POSITIVE_RATE) falls back to the usual lookup.
+# The filter is built from the users table in the background at startup and
+# answers "maybe" for everything until it is ready. Names created or renamed in
+# this process are added at once, names from other workers by a periodic scan
+# of new user ids. A registration that slips past a stale filter is still
+# stopped by the unique username index.
+import asyncio
+import hashlib
+import logging
+import math
+import os
+from sqlalchemy import func, select
+import metrics
+import models
+
+logger = logging.getLogger(__name__)
+
+USERNAME_FILTER_FALSE_POSITIVE_RATE = float(os.getenv('USERNAME_FILTER_FALSE_POSITIVE_RATE', '0.01'))
+# Minimum number of names the filter is sized for; it is rebuilt at twice the
+# number of users whenever it fills up
+USERNAME_FILTER_CAPACITY = int(os.getenv('USERNAME_FILTER_CAPACITY', '100000'))
+USERNAME_FILTER_REFRESH_SECONDS = float(os.getenv('USERNAME_FILTER_REFRESH_SECONDS', '30'))
+USERNAME_FILTER_LOAD_BATCH_SIZE = int(os.getenv('USERNAME_FILTER_LOAD_BATCH_SIZE', '5000'))
+
+# Fixed-size Bloom filter over strings, using k positions derived from one
+# 128-bit blake2b digest by double hashing
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    # Expected false positive rate at the current number of items
+    def false_positive_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+# Names are compared case-insensitively, like the default MySQL collation of
+# the unique index; on case-sensitive databases this only adds positives
+def _key(username: str) -> str:
+    return username.casefold()
+
+# The process-wide username filter and the background task that fills it
+class UsernameFilter:
+    def __init__(self, session_factory, capacity: int, error_rate: float, refresh_interval: float, batch_size: int):
+        self.session_factory = session_factory
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        self.bloom = None
+        self._building = None
+        self.ready = False
+        self._last_id = 0
+        self._task = None
+        self.negatives = 0
+        self.positives = 0
+
+    # False only if the name is certainly not taken
+    def might_exist(self, username: str) -> bool:
+        if not self.ready:
+            return True
+        if _key(username) in self.bloom:
+            self.positives += 1
+            return True
+        self.negatives += 1
+        return False
+
+    # Record a name that was just created or renamed to
+    def add(self, username: str):
+        if self.bloom is not None:
+            self.bloom.add(_key(username))
+        if self._building is not None and self._building is not self.bloom:
+            self._building.add(_key(username))
+
+    # Add the names of users with ids above the last one seen, in batches
+    async def _scan(self, db, bloom: BloomFilter, after_id: int) -> int:
+        while True:
+            result = await db.execute(
+                select(models.User.id, models.User.username)
+                .where(models.User.id > after_id)
+                .order_by(models.User.id)
+                .limit(self.batch_size)
+            )
+            rows = result.all()
+            for _, username in rows:
+                if username is not None:
+                    bloom.add(_key(username))
+            if rows:
+                after_id = rows[-1][0]
+            if len(rows) < self.batch_size:
+                return after_id
+            await asyncio.sleep(0)
+
+    # Build a filter sized for the current users and swap it in; names created
+    # while it is being built are added to it as well
+    async def load(self):
+        async with self.session_factory() as db:
+            users = await db.scalar(select(func.count(models.User.id)))
+            self._building = BloomFilter(max(self.capacity, 2 * users), self.error_rate)
+            if self.bloom is None:
+                self.bloom = self._building
+            try:
+                last_id = await self._scan(db, self._building, 0)
+                self.bloom, self._last_id, self.ready = self._building, last_id, True
+            finally:
+                self._building = None
+
+    # Pick up users created by other workers, rebuilding once the filter is full
+    async def refresh(self):
+        if self.bloom.count > self.bloom.capacity:
+            await self.load()
+            return
+        async with self.session_factory() as db:
+            self._last_id = await self._scan(db, self.bloom, self._last_id)
+
+    async def _run(self):
+        while True:
+            try:
+                await (self.refresh() if self.ready else self.load())
+            except Exception:
+                logger.exception("Loading usernames into the filter failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    # Start loading, called on application startup
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # Stop the background refresh, called on application shutdown
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+username_filter = None
+
+# Create the process-wide filter bound to a session factory
+def init_filter(session_factory) -> UsernameFilter:
+    global username_filter
+    username_filter = UsernameFilter(
+        session_factory, USERNAME_FILTER_CAPACITY, USERNAME_FILTER_FALSE_POSITIVE_RATE,
+        USERNAME_FILTER_REFRESH_SECONDS, USERNAME_FILTER_LOAD_BATCH_SIZE,
+    )
+    return username_filter
+
+# False only if the name is certainly not taken; True while no filter is loaded
+def might_exist(username: str) -> bool:
+    return username_filter is None or username_filter.might_exist(username)
+
+# Record a name that was just created or renamed to
+def add(username: str):
+    if username_filter is not None:
+        username_filter.add(username)
+
+@metrics.register
+def collect_username_filter_metrics():
+    if username_filter is None or username_filter.bloom is None:
+        return {}
+    bloom = username_filter.bloom
+    return {
+        "username_filter_ready": int(username_filter.ready),
+        "username_filter_items": bloom.count,
+        "username_filter_capacity": bloom.capacity,
+        "username_filter_bits": bloom.size,
+        "username_filter_hash_functions": bloom.hashes,
+        "username_filter_memory_bytes": bloom.nbytes,
+        "username_filter_target_false_positive_rate": bloom.error_rate,
+        "username_filter_estimated_false_positive_rate": round(bloom.false_positive_rate(), 6),
+        "username_filter_negatives_total": username_filter.negatives,
+        "username_filter_positives_total": username_filter.positives,
+    }
@@ -30,6 +30,7 @@ function Login() {
 
 		try {
 			const response = await fetch('http://localhost:8000/token/', {
+				credentials: 'include',
 				method: 'POST',
 				headers: {
 					'Content-Type': 'application/x-www-form-urlencoded',
@@ -15,6 +15,7 @@ function ProtectedPage() {
 
       try {
         const response = await fetch('http://localhost:8000/verify-token/', {
+          credentials: 'include',
           method: 'GET',
           headers: {
             'Authorization': `Bearer ${token}`,  // Send token in Authorization header
@@ -3,6 +3,12 @@ import ReactDOM from 'react-dom/client';
 import './index.css';
 import App from './App';
 import reportWebVitals from './reportWebVitals';
+import axios from 'axios';
+
+// Send cookies with every API request. The backend marks a client that just
+// wrote with a short-lived cookie so its next reads go to the primary database
+// instead of a lagging replica; cross-origin requests drop it otherwise.
+axios.defaults.withCredentials = true;
 
 const root = ReactDOM.createRoot(document.getElementById('root'));
 root.render(
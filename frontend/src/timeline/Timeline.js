@@ -7,34 +7,59 @@ import axios from 'axios';
 
 function Timeline() {
 	const [posts, setPosts] = useState([]);
+	const [nextCursor, setNextCursor] = useState(null);
+	const [likedPostIds, setLikedPostIds] = useState(new Set());
 	const [stories, setStories] = useState([]);
 
-	// Get the posts from fastapi using axios
-	useEffect(() => {
-		const fetchPosts = async () => {
-			try {
-				const response = await axios.get(
-					'http://localhost:8000/posts/'
-				);
-				console.log('Fetched posts:', response.data);
-				setPosts(response.data);
-			} catch (error) {
-				console.error('Error fetching posts:', error);
-			}
-		};
+	// Ask which of the fetched posts the logged in user already liked, in one request
+	const fetchLiked = async (postIds) => {
+		const token = localStorage.getItem('token');
+		if (!token || postIds.length === 0) return;
+		try {
+			const params = new URLSearchParams();
+			postIds.forEach((id) => params.append('post_ids', id));
+			const response = await axios.get('http://localhost:8000/likes/', {
+				params,
+				headers: { Authorization: `Bearer ${token}` },
+			});
+			setLikedPostIds(
+				(previous) => new Set([...previous, ...response.data.liked_post_ids])
+			);
+		} catch (error) {
+			console.error('Error fetching likes:', error);
+		}
+	};
+
+	// Get a page of posts from fastapi using axios, appending after the first page
+	const fetchPosts = async (cursor = null) => {
+		try {
+			const response = await axios.get('http://localhost:8000/posts/', {
+				params: cursor ? { cursor } : {},
+			});
+			console.log('Fetched posts:', response.data);
+			setPosts((previous) =>
+				cursor ? [...previous, ...response.data.items] : response.data.items
+			);
+			setNextCursor(response.data.next_cursor);
+			fetchLiked(response.data.items.map((post) => post.id));
+		} catch (error) {
+			console.error('Error fetching posts:', error);
+		}
+	};
 
+	useEffect(() => {
 		fetchPosts();
 	}, []);
 
-	// Same thing but for stories
+	// Get the story tray, already grouped by author on the server
 	useEffect(() => {
 		const fetchStories = async () => {
 			try {
 				const response = await axios.get(
-					'http://localhost:8000/stories/'
+					'http://localhost:8000/stories/tray'
 				);
 				console.log('Fetched stories:', response.data);
-				setStories(response.data);
+				setStories(response.data.authors);
 			} catch (error) {
 				console.error('Error fetching stories:', error);
 			}
@@ -49,9 +74,10 @@ function Timeline() {
 				<div className="timeline__stories">
 					{stories.length > 0 ? (
 						<Stories
-							stories={stories.map((story) => ({
-								user: story.username,
-								image: story.image_url,
+							stories={stories.map((author) => ({
+								user: author.username,
+								image: author.stories[0].image_url,
+								thumbnail: author.stories[0].variants[0]?.url,
 							}))}
 						/>
 					) : (
@@ -63,9 +89,12 @@ function Timeline() {
 						posts.map((post) => (
 							<Post
 								key={post.id}
+								postId={post.id}
 								user={post.username || ''}
 								postImage={post.image_url}
+								variants={post.variants}
 								likes={post.likes}
+								liked={likedPostIds.has(post.id)}
 								timestamp={post.timestamp || 'Just now'}
 								description={post.description || ''}
 							/>
@@ -73,6 +102,14 @@ function Timeline() {
 					) : (
 						<p>No posts available</p>
 					)}
+					{nextCursor && (
+						<button
+							className="timeline__loadMore"
+							onClick={() => fetchPosts(nextCursor)}
+						>
+							Load more
+						</button>
+					)}
 				</div>
 			</div>
 			<div className="timeline__right">
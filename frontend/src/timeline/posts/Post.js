@@ -1,15 +1,39 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import './Post.css';
 import { Avatar } from '@mui/material';
 import {
 	BookmarkBorder,
 	ChatBubbleOutline,
+	Favorite,
 	FavoriteBorder,
 	MoreHoriz,
 	Telegram,
 } from '@mui/icons-material';
+import axios from 'axios';
+
+function Post({ postId, user, postImage, variants = [], likes, liked, timestamp, description }) {
+	const [likeCount, setLikeCount] = useState(likes);
+	const [isLiked, setIsLiked] = useState(liked);
+
+	useEffect(() => {
+		setIsLiked(liked);
+	}, [liked]);
+
+	// Like or unlike the post; the server returns the new count
+	const handleLike = async () => {
+		try {
+			const response = await axios({
+				method: isLiked ? 'delete' : 'post',
+				url: `http://localhost:8000/posts/${postId}/like`,
+				headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+			});
+			setIsLiked(response.data.liked);
+			setLikeCount(response.data.likes);
+		} catch (error) {
+			console.error('Error liking post:', error);
+		}
+	};
 
-function Post({ user, postImage, likes, timestamp, description }) {
 	return (
 		<div className="post">
 			<div className="post__header">
@@ -24,6 +48,8 @@ function Post({ user, postImage, likes, timestamp, description }) {
 			<div className="post__image">
 				<img
 					src={postImage}
+					srcSet={variants.map((variant) => `${variant.url} ${variant.width}w`).join(', ') || undefined}
+					sizes="(max-width: 640px) 100vw, 640px"
 					alt="postImage"
 				/>
 			</div>
@@ -31,7 +57,11 @@ function Post({ user, postImage, likes, timestamp, description }) {
 			<div className="post__footer">
 				<div className="post__footerIcons">
 					<div className="post__iconsMain">
-						<FavoriteBorder className="post__like" />
+						{isLiked ? (
+							<Favorite className="post__like" onClick={handleLike} />
+						) : (
+							<FavoriteBorder className="post__like" onClick={handleLike} />
+						)}
 						<ChatBubbleOutline className="post__comment" />
 						<Telegram className="post__send" />
 					</div>
@@ -40,7 +70,7 @@ function Post({ user, postImage, likes, timestamp, description }) {
 					</div>
 					<div className="post__iconsMain"></div>
 				</div>
-				<span className="post__likes"> {likes} likes </span>
+				<span className="post__likes"> {likeCount} likes </span>
 			</div>
 			<div className="post__description">
 				<span className="post__descriptionUsername"> {user} </span>
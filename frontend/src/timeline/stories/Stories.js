@@ -43,7 +43,7 @@ function Stories({ stories }) {
 							onClick={() => handleStoryClick(story)}
 						>
 							<div className="story__border">
-                                <img src={story.image} alt={story.user} className="story__avatar" />
+                                <img src={story.thumbnail || story.image} alt={story.user} className="story__avatar" />
 							</div>
 							<span className="story__username">{story.user || 'Unknown'}</span>
 						</div>